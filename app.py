@@ -1,49 +1,187 @@
+import json
+import logging
 import os
 
-from flask import Flask, jsonify
+import click
+from flask import Flask, current_app, jsonify
+from flask.cli import with_appcontext
 from flask_restful import Api
 from flask_jwt_extended import JWTManager
 from marshmallow import ValidationError
 
-from db import db
+from db import REPLICA_BIND, db
 from blacklist import BLACKLIST
-from resources.user import UserRegister, UserLogin, User, TokenRefresh, UserLogout
-from resources.item import Item, ItemList
-from resources.store import Store, StoreList
-from resources.confirmation import Confirmation, ConfirmationByUser
 
 from ma import ma
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["PROPAGATE_EXCEPTIONS"] = True
+from libs import strings
+from libs.fast_json import output_json
+from libs.log import configure_logging, get_logger
+
+logger = get_logger(__name__)
+jwt = JWTManager()
+
+# env variable -> (create_engine keyword, type), only the ones that are set are passed on
+ENGINE_OPTIONS_FROM_ENV = {
+    "DB_POOL_SIZE": ("pool_size", int),
+    "DB_MAX_OVERFLOW": ("max_overflow", int),
+    "DB_POOL_TIMEOUT": ("pool_timeout", float),
+    "DB_POOL_RECYCLE": ("pool_recycle", int),
+    "DB_POOL_PRE_PING": ("pool_pre_ping", lambda value: value.lower() in ("1", "true", "yes", "on")),
+}
+
+
+def engine_options_from_env() -> dict:
+    options = {"pool_pre_ping": True}  # a cheap check beats handing out a connection the server already closed
+    for variable, (option, cast) in ENGINE_OPTIONS_FROM_ENV.items():
+        if os.environ.get(variable):
+            options[option] = cast(os.environ[variable])
+    return options
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Application factory, used by `flask` (it finds `create_app` by itself) and gunicorn: `gunicorn "app:create_app()"`.
+
+    Extra config:
+    CREATE_TABLES (default True) runs db.create_all() once here rather than on the first request
+    OUTBOX_WORKER (default OUTBOX_WORKER env, else False) starts a background libs.outbox.OutboxWorker in this process.
+        Registration only queues its emails, so without it `flask outbox-worker` must run as a separate process,
+        or no confirmation email is ever sent
+    CONFIRMATION_MODE (default CONFIRMATION_MODE env, else "database") "token" emails signed links instead of
+        storing confirmation rows, see libs.confirmation_token, links of either kind are accepted in both modes
+    METRICS_ENABLED (default METRICS_ENABLED env, else True) records timings and serves them on /metrics
+    RATE_LIMIT_ENABLED (default RATE_LIMIT_ENABLED env, else True) throttles /login and /register, see rate_limits.py
+    STRINGS_AUTO_RELOAD (default STRINGS_AUTO_RELOAD env, else app.debug) picks up edits to strings/*.json while running
+    """
+    configure_logging()
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env()  # applies to the replica too
+    if os.environ.get("DATABASE_REPLICA_URI"):
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: os.environ["DATABASE_REPLICA_URI"]}  # see db.py
+    app.config["PROPAGATE_EXCEPTIONS"] = True
+    app.config["CREATE_TABLES"] = True
+    app.config["OUTBOX_WORKER"] = os.environ.get("OUTBOX_WORKER", "false").lower() in ("1", "true", "yes", "on")
+    app.config["CONFIRMATION_MODE"] = os.environ.get("CONFIRMATION_MODE", "database")
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+    app.config["RATE_LIMIT_ENABLED"] = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+    if os.environ.get("STRINGS_AUTO_RELOAD"):
+        app.config["STRINGS_AUTO_RELOAD"] = os.environ["STRINGS_AUTO_RELOAD"].lower() in ("1", "true", "yes", "on")
+    app.secret_key = os.environ.get("SECRET_KEY")  # could do app.config['JWT_SECRET_KEY'] if we prefer
+    app.config.update(config or {})
 
-app.secret_key = os.environ.get("SECRET_KEY")  # could do app.config['JWT_SECRET_KEY'] if we prefer
-api = Api(app)
-
-
-@app.before_first_request
-def create_tables():
-    db.create_all()
+    db.init_app(app)
+    ma.init_app(app)    # this tells marshmallow what flask app it should be talking too
+    jwt.init_app(app)
+
+    # todo info: not we can have many of these here
+    app.register_error_handler(ValidationError, handle_marshmallow_validation)
+
+    if app.config["METRICS_ENABLED"]:
+        import metrics
+        metrics.init_app(app)   # first, so the timings include the other before_request hooks
+
+    if app.config.get("STRINGS_AUTO_RELOAD", app.debug):
+        app.before_request(reload_strings)
+
+    import pages
+    pages.init_app(app)     # renders the confirmation page and compresses the static assets, once
+
+    api = Api(app)
+    api.representation("application/json")(output_json)  # orjson/ujson when installed, see libs.fast_json
+    register_resources(api)
+    for command in (purge_revoked_tokens, purge_confirmations, run_outbox_worker, import_users_command):
+        app.cli.add_command(command)
+
+    if app.config["CREATE_TABLES"]:
+        with app.app_context():
+            db.create_all()
+
+    if app.config["OUTBOX_WORKER"]:
+        from libs.outbox import OutboxWorker
+        OutboxWorker(app).start()   # delivers the confirmation emails queued by the resources
+
+    return app
+
+
+def register_resources(api: Api) -> None:
+    # imported here so importing app.py stays cheap, the schemas are only built on first use (see libs.lazy_schema)
+    from resources.user import UserRegister, UserImport, UserLogin, User, TokenRefresh, UserLogout
+    from resources.item import Item, ItemList, ItemSearch
+    from resources.store import Store, StoreList
+    from resources.confirmation import Confirmation, ConfirmationByUser
+
+    api.add_resource(Store, "/store/<string:name>")
+    api.add_resource(StoreList, "/stores")
+    api.add_resource(Item, "/item/<string:name>")
+    api.add_resource(ItemList, "/items")
+    api.add_resource(ItemSearch, "/items/search")
+    api.add_resource(UserRegister, "/register")
+    api.add_resource(UserImport, "/users/import")
+    api.add_resource(User, "/user/<int:user_id>")
+    api.add_resource(UserLogin, "/login")
+    api.add_resource(TokenRefresh, "/refresh")
+    api.add_resource(UserLogout, "/logout")
+    api.add_resource(Confirmation, "/confirmation/<string:confirmation_id>")
+    api.add_resource(ConfirmationByUser, "/confirmation/user/<int:user_id>")
+
+
+def reload_strings():
+    strings.reload_if_changed()     # not returned, anything but None from a before_request replaces the response
+
+
+@click.command("purge-revoked-tokens")
+@with_appcontext
+def purge_revoked_tokens():
+    """Deletes revoked tokens that have expired anyway, run it from cron: `flask purge-revoked-tokens`."""
+    print(f"Purged {BLACKLIST.purge_expired()} expired revoked tokens.")
+
+
+@click.command("purge-confirmations")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows deleted per transaction.")
+@with_appcontext
+def purge_confirmations(batch_size):
+    """Deletes expired, never confirmed confirmations, run it from cron: `flask purge-confirmations`."""
+    from models.confirmation import ConfirmationModel
+    print(f"Purged {ConfirmationModel.purge_expired(batch_size)} expired confirmations.")
+
+
+@click.command("import-users")
+@click.argument("path", type=click.File())
+@click.option("--chunk-size", default=500, show_default=True, help="Users inserted per transaction.")
+@click.option("--base-url", default="http://localhost:5000", show_default=True, help="Root of the confirmation links.")
+@with_appcontext
+def import_users_command(path, chunk_size, base_url):
+    """Registers the users in a JSON file (a list of {"username", "password", "email"}), prints the per-row errors."""
+    from libs.user_import import import_users
+    rows = json.load(path)
+    with current_app.test_request_context(base_url=base_url):  # the emailed links are built from the request URL
+        report = import_users(rows.get("users", []) if isinstance(rows, dict) else rows, chunk_size)
+    print(json.dumps(report.to_dict()["errors"], indent=2))
+    print(f"Imported {len(report.created)} users, {len(report.errors)} rows failed.")
+
+
+@click.command("outbox-worker")
+@with_appcontext
+def run_outbox_worker():
+    """Sends queued emails until interrupted, a required process unless the web workers run with OUTBOX_WORKER=true."""
+    from libs.outbox import OutboxWorker
+    OutboxWorker(current_app._get_current_object()).run()
 
 
-# todo info: not we can have many of these here
-@app.errorhandler(ValidationError)
 def handle_marshmallow_validation(err):     # ValidationError err Exception
     return jsonify(err.messages), 400
 
 
-jwt = JWTManager(app)
-
-
 # This method will check if a token is blacklisted, and will be called automatically when blacklist is enabled
 @jwt.token_in_blocklist_loader
 def check_if_token_in_blacklist(jwt_header, jwt_payload):
     jti = jwt_payload["jti"]
 
-    print("jti::", jti)
-    print("HEADER::", jwt_header)
-    print("PAYLOAD::", jwt_payload)
+    if logger.isEnabledFor(logging.DEBUG):  # runs on every protected request, keep it free when not debugging
+        logger.debug("checking token", extra={"fields": {"jti": jti, "header": jwt_header, "payload": jwt_payload}})
 
     return jti in BLACKLIST
 
@@ -64,19 +202,5 @@ def revoked_token_callback(jwt_header, jwt_payload):
     }), 401
 
 
-api.add_resource(Store, "/store/<string:name>")
-api.add_resource(StoreList, "/stores")
-api.add_resource(Item, "/item/<string:name>")
-api.add_resource(ItemList, "/items")
-api.add_resource(UserRegister, "/register")
-api.add_resource(User, "/user/<int:user_id>")
-api.add_resource(UserLogin, "/login")
-api.add_resource(TokenRefresh, "/refresh")
-api.add_resource(UserLogout, "/logout")
-api.add_resource(Confirmation, "/confirmation/<string:confirmation_id>")
-api.add_resource(ConfirmationByUser, "/confirmation/user/<int:user_id>")
-
 if __name__ == "__main__":
-    db.init_app(app)
-    ma.init_app(app)    # this tells marshmallow what flask app it should be talking too
-    app.run(port=5000, debug=True)
+    create_app({"OUTBOX_WORKER": True}).run(port=5000, debug=True)
@@ -0,0 +1,71 @@
+"""
+Time ConfirmationModel.purge_expired on a seeded confirmation table.
+
+    python -m benchmarks.confirmation_purge --rows 1000000 --batch-size 5000
+
+Seeds users and confirmations (three quarters of them expired, a tenth of those confirmed) into a throwaway SQLite
+file, unless --database-uri points somewhere else, then purges and prints the timings.
+"""
+import argparse
+import os
+import tempfile
+import time
+from uuid import uuid4
+
+from app import create_app
+from db import db
+from models.confirmation import ConfirmationModel
+from models.user import UserModel
+
+USERS = 1000
+
+
+def seed(rows: int) -> None:
+    now = int(time.time())
+    db.session.execute(UserModel.__table__.insert(), [
+        {"id": i, "username": f"user{i}", "password": "x", "email": f"user{i}@example.com"} for i in range(1, USERS + 1)
+    ])
+    for start in range(0, rows, 50000):
+        db.session.execute(ConfirmationModel.__table__.insert(), [
+            {
+                "id": uuid4().hex,
+                "expire_at": now - 3600 if n % 4 else now + 3600,
+                "confirmed": n % 40 == 1,
+                "user_id": n % USERS + 1,
+            }
+            for n in range(start, min(start + 50000, rows))
+        ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--database-uri")
+    args = parser.parse_args()
+
+    path = None
+    if args.database_uri is None:
+        path = tempfile.mktemp(suffix=".db")
+        args.database_uri = f"sqlite:///{path}"
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": args.database_uri})
+    try:
+        with app.app_context():
+            started = time.perf_counter()
+            seed(args.rows)
+            print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            purged = ConfirmationModel.purge_expired(args.batch_size)
+            elapsed = time.perf_counter() - started
+            print(f"purged {purged} rows in {elapsed:.1f}s ({purged / elapsed:.0f} rows/s), "
+                  f"{ConfirmationModel.query.count()} left")
+    finally:
+        if path is not None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+/items/search on a large catalogue: time per query and the database's plan for each, to check they stay index driven.
+
+    python -m benchmarks.item_search --items 500000 --repeat 20
+    python -m benchmarks.item_search --database-uri postgresql://localhost/bench   # also exercises ?q= full text
+
+Seeds a throwaway SQLite file unless --database-uri is given. A plan that scans the whole item table (SQLite's
+"SCAN item" without an index, Postgres' "Seq Scan on item") is flagged, ?q= is expected to scan on SQLite.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app import create_app
+from db import db
+from models.item import ItemModel
+from models.store import StoreModel
+
+STORES = 500
+PAGE = 50
+
+CASES = {
+    "name prefix": {"name_prefix": "item12"},
+    "store": {"store_id": 42},
+    "store, price order": {"store_id": 42, "sort": "price"},
+    "store + price range": {"store_id": 42, "min_price": 100, "max_price": 200},
+    "price range, -price": {"min_price": 100, "max_price": 110, "sort": "-price"},
+    "price order, page 2": {"sort": "price", "after": (500.0, 250000)},
+    "text": {"text": "item4242"},
+}
+
+
+def seed(items: int) -> None:
+    db.session.execute(StoreModel.__table__.insert(), [{"id": i, "name": f"store{i}"} for i in range(1, STORES + 1)])
+    rng = random.Random(7)
+    for start in range(0, items, 50000):
+        db.session.execute(ItemModel.__table__.insert(), [
+            {"name": f"item{i}", "price": round(rng.uniform(1, 1000), 2), "request_id": f"BENCH-{i}",
+             "store_id": rng.randint(1, STORES)}
+            for i in range(start, min(start + 50000, items))
+        ])
+    db.session.commit()
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute("ANALYZE item")
+    else:
+        db.session.execute("ANALYZE")
+    db.session.commit()
+
+
+def plan(query) -> str:
+    sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    if db.engine.dialect.name == "sqlite":
+        return "; ".join(row[-1] for row in db.session.execute(f"EXPLAIN QUERY PLAN {sql}"))
+    return "; ".join(row[0].strip() for row in db.session.execute(f"EXPLAIN {sql}"))
+
+
+def full_scan(plan_text: str) -> bool:
+    if "Seq Scan on item" in plan_text:
+        return True
+    return any(step.strip() == "SCAN item" for step in plan_text.split(";"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-uri")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": args.database_uri or f"sqlite:///{os.path.join(tmp, 'search.db')}",
+        })
+        with app.app_context():
+            started = time.perf_counter()
+            seed(args.items)
+            print(f"seeded {args.items} items in {time.perf_counter() - started:.1f}s\n")
+
+            for name, filters in CASES.items():
+                query = ItemModel.search_query(**filters).limit(PAGE)
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    rows = query.all()
+                elapsed = (time.perf_counter() - started) / args.repeat * 1000
+                plan_text = plan(query)
+                flag = "FULL SCAN " if full_scan(plan_text) else ""
+                print(f"{name:<22} {len(rows):>3} rows {elapsed:>8.2f} ms  {flag}{plan_text}")
+
+
+if __name__ == "__main__":
+    main()
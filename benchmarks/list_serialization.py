@@ -0,0 +1,69 @@
+"""
+Cost of building a /items or /stores page: ORM objects + marshmallow dump + stdlib json (the old path) against
+column rows + libs.fast_json (the current one).
+
+    python -m benchmarks.list_serialization --items 20000 --page 1000 --repeat 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app import create_app
+from db import db
+from libs import fast_json
+from models.item import ItemModel
+from models.store import StoreModel
+from schemas.item import ItemSchema
+from schemas.store import StoreSchema
+
+STORES = 100
+
+
+def seed(items: int) -> None:
+    db.session.execute(StoreModel.__table__.insert(), [{"id": i, "name": f"store{i}"} for i in range(1, STORES + 1)])
+    db.session.execute(ItemModel.__table__.insert(), [
+        {"name": f"item{i}", "price": i / 100, "request_id": f"BENCH-{i}", "store_id": i % STORES + 1}
+        for i in range(1, items + 1)
+    ])
+    db.session.commit()
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+        db.session.expunge_all()  # every request starts with an empty session
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    item_list_schema = ItemSchema(many=True)
+    store_list_schema = StoreSchema(many=True)
+    cases = {
+        "items  schema + json": lambda: json.dumps(item_list_schema.dump(ItemModel.find_page(args.page))),
+        "items  rows + " + fast_json.BACKEND: lambda: fast_json.dumps(ItemModel.find_page_rows(args.page)),
+        "stores schema + json": lambda: json.dumps(
+            store_list_schema.dump(StoreModel.prefetch_items(StoreModel.find_page(STORES)))
+        ),
+        "stores rows + " + fast_json.BACKEND: lambda: fast_json.dumps(StoreModel.find_page_rows(STORES)),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        with app.app_context():
+            seed(args.items)
+            print(f"{'path':<24} {'ms per page':>12}")
+            for name, fn in cases.items():
+                print(f"{name:<24} {timed(fn, args.repeat):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Load test of the hot endpoints over real HTTP: throughput, p50/p99 latency and SQL statements per request.
+
+    python -m benchmarks.load --concurrency 16 --requests 2000
+    python -m benchmarks.load --scenarios items,item --json > baseline.json
+    python -m benchmarks.load --compare baseline.json --tolerance 0.25   # exits 1 when a scenario got slower
+
+Seeds stores, items and confirmed users into a throwaway SQLite file (or --database-uri, e.g. a local Postgres),
+serves create_app() from a threaded werkzeug server in this process and drives it with one requests.Session per
+client thread. Emails are only queued (no outbox worker runs, MAIL_TRANSPORT is stub) and rate limiting is off.
+
+Scenarios: login (POST /login), items (GET /items), stores (GET /stores), item (GET /item/<name>),
+register (POST /register).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+os.environ.setdefault("MAIL_TRANSPORT", "stub")
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app
+from db import db
+from libs.passwords import hasher
+from libs.query_counter import count_queries
+from models.confirmation import ConfirmationModel
+from models.item import ItemModel
+from models.store import StoreModel
+from models.user import UserModel
+
+PASSWORD = "benchmark-password"
+
+
+class Scenario(NamedTuple):
+    method: str
+    expected: int
+    request: Callable[[int, argparse.Namespace], Tuple[str, Optional[dict]]]  # request number -> (path, json body)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "login": Scenario("POST", 200, lambda i, args: (
+        "/login", {"username": f"user{i % args.users}", "password": PASSWORD}
+    )),
+    "items": Scenario("GET", 200, lambda i, args: ("/items?limit=100", None)),
+    "stores": Scenario("GET", 200, lambda i, args: ("/stores?limit=20", None)),
+    "item": Scenario("GET", 200, lambda i, args: (f"/item/item{i % (args.stores * args.items_per_store)}", None)),
+    "register": Scenario("POST", 201, lambda i, args: (
+        "/register", {"username": f"new{i}", "password": PASSWORD, "email": f"new{i}@example.com"}
+    )),
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass    # one access log line per request would skew the timings
+
+
+def seed(args) -> None:
+    now = int(time.time())
+    db.session.execute(StoreModel.__table__.insert(), [
+        {"id": s, "name": f"store{s}"} for s in range(1, args.stores + 1)
+    ])
+    db.session.execute(ItemModel.__table__.insert(), [
+        {"name": f"item{i}", "price": i / 100, "request_id": f"BENCH-{i}", "store_id": i % args.stores + 1}
+        for i in range(args.stores * args.items_per_store)
+    ])
+    password = hasher.hash(PASSWORD)   # one (slow) hash shared by every seeded user
+    db.session.execute(UserModel.__table__.insert(), [
+        {"id": u + 1, "username": f"user{u}", "password": password, "email": f"user{u}@example.com"}
+        for u in range(args.users)
+    ])
+    db.session.execute(ConfirmationModel.__table__.insert(), [
+        {"id": f"bench{u}", "expire_at": now + 86400, "confirmed": True, "user_id": u + 1} for u in range(args.users)
+    ])
+    db.session.commit()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_scenario(base_url: str, scenario: Scenario, args, count_sql: bool = True) -> dict:
+    """`count_sql` needs an app context on the same database as the server, i.e. a server in this process."""
+    counter = iter(range(args.requests))
+    lock = threading.Lock()
+
+    def client() -> Tuple[List[float], int]:
+        session = requests.Session()     # one keep-alive connection per client thread
+        latencies, errors = [], 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return latencies, errors
+            path, body = scenario.request(i, args)
+            started = time.perf_counter()
+            response = session.request(scenario.method, base_url + path, json=body)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code != scenario.expected
+
+    with count_queries() if count_sql else nullcontext() as queries:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            results = [f.result() for f in [pool.submit(client) for _ in range(args.concurrency)]]
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "sql_per_request": queries.count / len(latencies) if count_sql else None,
+    }
+
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            found.append(f"{name}: p99 {before['p99_ms']:.1f}ms -> {result['p99_ms']:.1f}ms")
+        if result["sql_per_request"] > before["sql_per_request"] + 0.01:
+            found.append(f"{name}: SQL/request {before['sql_per_request']:.2f} -> {result['sql_per_request']:.2f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario.")
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--items-per-store", type=int, default=100)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--database-uri")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON, e.g. to save a baseline.")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --json run.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p99 slowdown against the baseline.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": args.database_uri or f"sqlite:///{os.path.join(tmp, 'load.db')}",
+            "RATE_LIMIT_ENABLED": False,
+        })
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        try:
+            with app.app_context():
+                seed(args)
+                results = {name: run_scenario(base_url, SCENARIOS[name], args) for name in args.scenarios.split(",")}
+        finally:
+            server.shutdown()
+            hasher.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'scenario':<10} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'SQL/req':>8}")
+        for name, r in results.items():
+            print(
+                f"{name:<10} {r['requests']:>8} {r['errors']:>6} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['sql_per_request']:>8.2f}"
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print("REGRESSION", line, file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
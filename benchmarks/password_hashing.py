@@ -0,0 +1,51 @@
+"""
+Logins per second at different scrypt costs, with the hashing done in the process pool.
+
+    python -m benchmarks.password_hashing --threads 16 --seconds 5
+
+Each thread plays a request thread verifying a password, the way UserLogin.post does.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.passwords import PasswordHasher
+
+COSTS = (2 ** 12, 2 ** 14, 2 ** 15, 2 ** 16)
+
+
+def logins_per_second(hasher: PasswordHasher, threads: int, seconds: float) -> float:
+    encoded = hasher.hash("correct horse battery staple")
+    deadline = time.perf_counter() + seconds
+
+    def login_loop() -> int:
+        done = 0
+        while time.perf_counter() < deadline:
+            hasher.verify("correct horse battery staple", encoded)
+            done += 1
+        return done
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: login_loop(), range(threads)))
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="0 hashes in the request threads")
+    args = parser.parse_args()
+
+    print(f"{'n':>8} {'logins/s':>10}")
+    for n in COSTS:
+        hasher = PasswordHasher(n=n, workers=args.workers, max_pending=args.threads)
+        try:
+            print(f"{n:>8} {logins_per_second(hasher, args.threads, args.seconds):>10.1f}")
+        finally:
+            hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
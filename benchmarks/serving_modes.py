@@ -0,0 +1,132 @@
+"""
+Threaded WSGI against the gevent serving mode (serve_async.py) under many concurrent clients.
+
+    python -m benchmarks.serving_modes --concurrency 500 --threads 16 --io-delay 20
+
+Each mode gets its own server process on the same seeded SQLite file:
+- threaded: a WSGI server with a fixed pool of --threads worker threads, like gunicorn's gthread worker
+- async: serve_async.serve(), one greenlet per request
+
+SQLite answers in microseconds, so --io-delay adds that many milliseconds of (cooperative, in the async mode) sleep
+to every SQL statement to stand in for the round trip to a database server; with --io-delay 0 both modes are CPU
+bound and should be close. Needs the optional `gevent` package.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("threaded", "async")
+
+
+def serve(mode: str, port: int, database_uri: str, threads: int, io_delay: float) -> None:
+    """Runs in the server process."""
+    if mode == "async":
+        import serve_async  # noqa: F401  monkey patches, has to come before the other imports
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app import create_app
+
+    if io_delay:
+        @event.listens_for(Engine, "before_cursor_execute")
+        def _network_round_trip(*args):
+            time.sleep(io_delay / 1000)    # gevent patches time.sleep, so this only parks the greenlet
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": database_uri, "RATE_LIMIT_ENABLED": False, "CREATE_TABLES": False})
+    if mode == "async":
+        serve_async.serve(app, port=port)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import BaseWSGIServer
+
+    from benchmarks.load import QuietHandler
+
+    class PooledWSGIServer(BaseWSGIServer):
+        pool = ThreadPoolExecutor(threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer("127.0.0.1", port, app, handler=QuietHandler).serve_forever()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="item,items,login")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario.")
+    parser.add_argument("--threads", type=int, default=16, help="Worker threads of the threaded server.")
+    parser.add_argument("--io-delay", type=float, default=10, help="Milliseconds added to every SQL statement.")
+    parser.add_argument("--stores", type=int, default=20)
+    parser.add_argument("--items-per-store", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--database-uri", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.database_uri, args.threads, args.io_delay)
+        return
+
+    from app import create_app
+    from benchmarks.load import SCENARIOS, run_scenario, seed
+    from libs.passwords import hasher
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f"sqlite:///{os.path.join(tmp, 'serving.db')}"
+        with create_app({"SQLALCHEMY_DATABASE_URI": database_uri}).app_context():
+            seed(args)
+        hasher.shutdown()
+
+        print(f"{'mode':<9} {'scenario':<8} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for mode in MODES:
+            port = free_port()
+            server = subprocess.Popen([
+                sys.executable, "-m", "benchmarks.serving_modes", "--serve", mode, "--port", str(port),
+                "--database-uri", database_uri, "--threads", str(args.threads), "--io-delay", str(args.io_delay),
+            ])
+            try:
+                wait_for(port)
+                for name in args.scenarios.split(","):
+                    r = run_scenario(f"http://127.0.0.1:{port}", SCENARIOS[name], args, count_sql=False)
+                    print(
+                        f"{mode:<9} {name:<8} {r['requests']:>8} {r['errors']:>6} {r['rps']:>8.1f} "
+                        f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
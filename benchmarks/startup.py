@@ -0,0 +1,64 @@
+"""
+Worker start up cost: importing app.py, create_app() and the first and second requests, each in a fresh interpreter.
+
+    python -m benchmarks.startup --runs 10
+
+Uses a throwaway SQLite file unless DATABASE_URI is set.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get("/items")
+first = time.perf_counter()
+client.get("/items")
+second = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_request": first - created,
+    "second_request": second - first,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URI": os.environ.get("DATABASE_URI", f"sqlite:///{tmp}/startup.db"),
+            "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark"),
+            "PYTHONWARNINGS": "ignore",
+        }
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, "-c", PROBE], cwd=root, env=env, capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'phase':<16} {'median ms':>10} {'max ms':>10}")
+    for phase in runs[0]:
+        timings = [run[phase] * 1000 for run in runs]
+        print(f"{phase:<16} {statistics.median(timings):>10.1f} {max(timings):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
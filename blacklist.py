@@ -1,9 +1,117 @@
 """
 blacklist.py
 
-This file just contains the blacklist of the JWT tokens–it will be imported by
+This file contains the blacklist of the JWT tokens–it will be imported by
 app and the logout resource so that tokens can be added to the blacklist when the
 user logs out.
+
+Revoked tokens are kept by a backend, by default the `revoked_token` table so every worker sees the
+same list and it survives restarts (set REVOCATION_BACKEND=memory for the old per-process set). In front
+of it sits a bounded LRU of jtis this process already knows are revoked, so repeated use of a revoked
+token never reaches the database. Only revocations are cached: a "not revoked" answer can be changed at
+any time by a logout on another worker.
 """
+import os
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from models.revoked_token import RevokedTokenModel
+
+REVOCATION_CACHE_SIZE = int(os.environ.get("REVOCATION_CACHE_SIZE", 10000))
+PURGE_EVERY = 1000  # revocations between two purges of expired rows
+
+
+class RevocationBackend:
+    def add(self, jti: str, expires_at: int) -> None:
+        raise NotImplementedError
+
+    def __contains__(self, jti: str) -> bool:
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryRevocationBackend(RevocationBackend):
+    """Per-process only, fine for a single worker or for tests."""
+
+    def __init__(self):
+        self._revoked = {}  # jti -> expires_at
+        self._lock = Lock()
+
+    def add(self, jti: str, expires_at: int) -> None:
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def purge_expired(self) -> int:
+        now = time()
+        with self._lock:
+            expired = [jti for jti, expires_at in self._revoked.items() if expires_at < now]
+            for jti in expired:
+                del self._revoked[jti]
+        return len(expired)
+
+
+class DatabaseRevocationBackend(RevocationBackend):
+    """Shared by every worker, needs an app context."""
+
+    def add(self, jti: str, expires_at: int) -> None:
+        RevokedTokenModel.revoke(jti, expires_at)
+
+    def __contains__(self, jti: str) -> bool:
+        return RevokedTokenModel.is_revoked(jti)
+
+    def purge_expired(self) -> int:
+        return RevokedTokenModel.purge_expired()
+
+
+class RevocationStore:
+    def __init__(self, backend: RevocationBackend, cache_size: int = REVOCATION_CACHE_SIZE):
+        self.backend = backend
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # jti -> expires_at, least recently used first
+        self._lock = Lock()
+        self._added = 0
+
+    def add(self, jti: str, expires_at: int) -> None:
+        self.backend.add(jti, expires_at)
+        self._remember(jti, expires_at)
+
+        self._added += 1
+        if self._added % PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def __contains__(self, jti: str) -> bool:
+        with self._lock:
+            if jti in self._cache:
+                self._cache.move_to_end(jti)
+                return True
+
+        if jti in self.backend:
+            self._remember(jti, None)
+            return True
+        return False
+
+    def purge_expired(self) -> int:
+        now = time()
+        with self._lock:
+            for jti in [jti for jti, expires_at in self._cache.items() if expires_at is not None and expires_at < now]:
+                del self._cache[jti]
+        return self.backend.purge_expired()
+
+    def _remember(self, jti: str, expires_at) -> None:
+        with self._lock:
+            self._cache[jti] = expires_at
+            self._cache.move_to_end(jti)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
 
-BLACKLIST = set()
+if os.environ.get("REVOCATION_BACKEND", "database") == "memory":
+    BLACKLIST = RevocationStore(MemoryRevocationBackend())
+else:
+    BLACKLIST = RevocationStore(DatabaseRevocationBackend())
@@ -0,0 +1,41 @@
+"""
+caches.py
+
+The read-through caches used by the item and store resources, keyed by name and holding the dumped JSON. Models
+invalidate them in save_to_db/delete_from_db.
+
+CACHE_BACKEND picks where entries live:
+- local (default): per process, so other workers can serve a stale entry for up to CACHE_TTL seconds after a write
+- redis: shared by every worker, needs the `redis` package and CACHE_REDIS_URL
+- shared-local: the shared code path against an in-process stand-in for Redis
+"""
+import os
+
+from libs.cache import Cache, LocalCache, LocalStore, SharedCache
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "local")
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 60))
+CACHE_MAXSIZE = int(os.environ.get("CACHE_MAXSIZE", 10000))
+
+
+def _shared_client():
+    if CACHE_BACKEND == "redis":
+        import redis  # optional dependency, only needed for this backend
+        return redis.Redis.from_url(os.environ["CACHE_REDIS_URL"])
+    return LocalStore()
+
+
+def _make_cache(name: str, client=None) -> Cache:
+    if CACHE_BACKEND == "local":
+        return LocalCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+    return SharedCache(client, prefix=name, ttl=CACHE_TTL)
+
+
+_client = None if CACHE_BACKEND == "local" else _shared_client()
+
+item_cache = _make_cache("item", _client)
+store_cache = _make_cache("store", _client)
+
+
+def cache_stats() -> dict:
+    return {"item": item_cache.stats(), "store": store_cache.stats()}
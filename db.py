@@ -1,3 +1,82 @@
-from flask_sqlalchemy import SQLAlchemy
+"""
+db.py
 
-db = SQLAlchemy()
+The Flask-SQLAlchemy instance, with a session that can send reads to a read replica.
+
+When SQLALCHEMY_BINDS has a "replica" entry (create_app sets it from DATABASE_REPLICA_URI), queries run inside a
+`replica_read` function (the models' find_* class methods) during a GET/HEAD request, or outside of any request, go to
+the replica, everything else goes to the primary. Lookups made by a write request (e.g. the "name already exists"
+checks) must see the latest data, and once a session has flushed anything it stops using the replica until the end
+of the request, so a request always reads its own writes even when the replica lags behind.
+
+A GET that has to see the latest data wraps it in `primary_read()`: cache fills (a stale row cached right after a
+write would be served for the whole TTL, long after the replica caught up) and the few GETs that write, like
+confirming an email address.
+"""
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+REPLICA_BIND = "replica"
+READ_ONLY_METHODS = ("GET", "HEAD")
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.db = db
+        self.use_replica = False
+        self.use_primary = False    # set by primary_read(), wins over replica_read
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.use_replica and not self.use_primary and not self.wrote and not self._flushing and self.has_replica:
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+    @property
+    def has_replica(self) -> bool:
+        return REPLICA_BIND in (self.app.config.get("SQLALCHEMY_BINDS") or {})
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _stick_to_primary(session, flush_context):
+    session.wrote = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
+
+
+def replica_read(fn):
+    """Runs the decorated (read only) function against the replica, if there is one."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if has_request_context() and request.method not in READ_ONLY_METHODS:
+            return fn(*args, **kwargs)
+
+        session = db.session()
+        previous, session.use_replica = session.use_replica, True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            session.use_replica = previous
+    return wrapper
+
+
+@contextmanager
+def primary_read():
+    """Within it replica_read functions read the primary, also usable as a decorator: @primary_read()."""
+    session = db.session()
+    previous, session.use_primary = session.use_primary, True
+    try:
+        yield
+    finally:
+        session.use_primary = previous
@@ -0,0 +1,159 @@
+"""
+libs.cache
+Small read-through caches for hot lookups, see caches.py for the instances the app uses.
+
+- LocalCache lives in the process, bounded by `maxsize` (least recently used entries go first) and `ttl`.
+- SharedCache keeps JSON encoded values in a shared key/value store such as Redis, so every worker sees the same
+  entries and invalidations. LocalStore stands in for that store (same client API, values kept as bytes) when
+  there is no Redis around, e.g. in tests.
+
+Only values that are not None are cached, a miss is never remembered.
+"""
+import fnmatch
+import json
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class Cache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+class LocalCache(Cache):
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        return {**super().stats(), "size": len(self._entries)}
+
+
+class LocalStore:
+    """In-process stand-in for a Redis client, implements just what SharedCache and the rate limiter use."""
+
+    def __init__(self):
+        self._data = {}  # key -> (expires_at, bytes)
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time()):
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        with self._lock:
+            self._data[key] = (time() + ex if ex else None, value)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time()):
+                entry = (None, b"0")
+            value = int(entry[1]) + 1
+            self._data[key] = (entry[0], str(value).encode())
+            return value
+
+    def expire(self, key: str, seconds: int) -> None:
+        with self._lock:
+            if key in self._data:
+                self._data[key] = (time() + seconds, self._data[key][1])
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def scan_iter(self, match: str):
+        with self._lock:
+            keys = list(self._data)
+        return (key for key in keys if fnmatch.fnmatchcase(key, match))
+
+
+class SharedCache(Cache):
+    def __init__(self, client, prefix: str, ttl: int = 60):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.prefix}:{key}"
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        raw = self.client.get(self._key(key))
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.client.set(self._key(key), json.dumps(value).encode(), ex=self.ttl)
+
+    def delete(self, key: Hashable) -> None:
+        self.client.delete(self._key(key))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
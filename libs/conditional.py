@@ -0,0 +1,48 @@
+"""
+libs.conditional
+HTTP conditional GET support: strong ETags, Last-Modified and 304 Not Modified answers.
+
+Resources build the validators from what they already have at hand (a version query, or the `id`/`updated_at` of a
+cached dump) and check them before producing a body, so an unchanged resource costs neither serialization nor
+bandwidth.
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.http import http_date, quote_etag
+
+
+def make_etag(*parts) -> str:
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def dump_validators(dumped: dict) -> Tuple[str, datetime]:
+    """ETag and Last-Modified of a dumped row, from its `id` and `updated_at` fields."""
+    return make_etag(dumped["id"], dumped["updated_at"]), datetime.fromisoformat(dumped["updated_at"])
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": quote_etag(etag)}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(_as_utc(last_modified))
+    return headers
+
+
+def is_not_modified(etag: str, last_modified: Optional[datetime] = None) -> bool:
+    # If-None-Match wins over If-Modified-Since when a client sends both (RFC 7232, section 6)
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(request.if_modified_since)
+    return False
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status=304, headers=validator_headers(etag, last_modified))
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # updated_at columns hold naive UTC times
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
@@ -0,0 +1,47 @@
+"""
+libs.confirmation_token
+Signed, time limited confirmation tokens, used instead of `confirmation` rows when CONFIRMATION_MODE is "token".
+
+A token carries the user id and email and is signed with the app's SECRET_KEY, its timestamp is part of the
+signature, so checking a link needs no database lookup at all. Tokens always contain a ".", ConfirmationModel ids
+(uuid4 hex) never do, which lets both kinds of link share the /confirmation/<confirmation_id> route.
+"""
+from typing import Tuple
+
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from models.confirmation import CONFIRMATION_EXPIRATION_DELTA
+
+SALT = "email-confirmation"    # keeps these tokens from being valid anywhere else the secret key signs things
+
+
+class ConfirmationTokenExpired(Exception):
+    pass
+
+
+class ConfirmationTokenInvalid(Exception):
+    pass
+
+
+def is_token(confirmation_id: str) -> bool:
+    return "." in confirmation_id
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.secret_key, salt=SALT)
+
+
+def make_token(user_id: int, email: str) -> str:
+    return _serializer().dumps([user_id, email])
+
+
+def load_token(token: str) -> Tuple[int, str]:
+    """Returns (user id, email), raises ConfirmationTokenExpired or ConfirmationTokenInvalid."""
+    try:
+        user_id, email = _serializer().loads(token, max_age=CONFIRMATION_EXPIRATION_DELTA)
+    except SignatureExpired:
+        raise ConfirmationTokenExpired()
+    except (BadSignature, ValueError, TypeError):
+        raise ConfirmationTokenInvalid()
+    return user_id, email
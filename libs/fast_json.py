@@ -0,0 +1,54 @@
+"""
+libs.fast_json
+JSON encoding for responses, using the fastest library that is installed: orjson, then ujson, then the stdlib.
+
+`output_json` is registered as flask_restful's application/json representation in create_app, so every dict a
+resource returns goes through it. `dumps` always returns str.
+"""
+import datetime
+import json
+from typing import Any, Dict, Optional
+
+from flask import make_response
+
+try:
+    import orjson
+except ImportError:  # optional, pip install orjson
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # optional, pip install ujson
+    ujson = None
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def dumps(data: Any) -> str:
+        return orjson.dumps(data).decode()
+elif ujson is not None:
+    BACKEND = "ujson"
+
+    def dumps(data: Any) -> str:
+        return ujson.dumps(data, ensure_ascii=False)
+else:
+    BACKEND = "json"
+
+    def dumps(data: Any) -> str:
+        return json.dumps(data, separators=(",", ":"))
+
+
+def output_json(data: Any, code: int, headers: Optional[Dict] = None):
+    response = make_response(dumps(data) + "\n", code)
+    response.headers.extend(headers or {})
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+def row_to_dict(row) -> Dict[str, Any]:
+    """A query result row (named tuple of columns) as the dict a schema dump would give."""
+    return {
+        key: value.isoformat() if isinstance(value, datetime.datetime) else value
+        for key, value in row._asdict().items()
+    }
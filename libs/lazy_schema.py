@@ -0,0 +1,33 @@
+"""
+libs.lazy_schema
+Stand-in for a module level schema instance that only imports and builds the schema when it is first used.
+
+SQLAlchemyAutoSchema classes inspect their model (and marshmallow builds every field) when they are defined and
+instantiated, which is a noticeable part of start up. Resources declare their schemas with
+
+    item_schema = LazySchema("schemas.item:ItemSchema")
+    item_list_schema = LazySchema("schemas.item:ItemSchema", many=True)
+
+and use them exactly like the real instance (`item_schema.dump(item)`).
+"""
+from importlib import import_module
+from threading import Lock
+
+
+class LazySchema:
+    def __init__(self, path: str, **kwargs):
+        self._path = path  # "<module>:<class>"
+        self._kwargs = kwargs
+        self._schema = None
+        self._lock = Lock()
+
+    def _get_schema(self):
+        if self._schema is None:
+            with self._lock:
+                if self._schema is None:
+                    module, name = self._path.split(":")
+                    self._schema = getattr(import_module(module), name)(**self._kwargs)
+        return self._schema
+
+    def __getattr__(self, name):
+        return getattr(self._get_schema(), name)
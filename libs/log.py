@@ -0,0 +1,57 @@
+"""
+libs.log
+Logging for the app, call 'libs.log.configure_logging()' once at start up and get loggers with 'get_logger(__name__)'.
+
+Records are only put on an in-memory queue by the thread that logs them, a single background listener thread does the
+actual (slow) writing, so request threads never wait on stdout/stderr. The level comes from the LOG_LEVEL env variable
+(WARNING by default), anything below it is dropped before a record is even built.
+
+Extra key=value fields can be attached with `extra={"fields": {...}}`, guard expensive ones with `logger.isEnabledFor`.
+"""
+import atexit
+import logging
+import os
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "WARNING").upper()
+ROOT_LOGGER = "stores_api"
+
+_listener: Optional[QueueListener] = None
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        return message
+
+
+def configure_logging(level: str = LOG_LEVEL, handler: Optional[logging.Handler] = None) -> None:
+    """Safe to call more than once, only the first call sets up the listener."""
+    global _listener
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    if _listener is not None:
+        return
+
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(KeyValueFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+
+    log_queue = SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # flushes whatever is still queued
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
@@ -1,42 +1,99 @@
+import json
 import os
-from typing import List
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
 
-from requests import Response, post
 from libs.strings import getText
 
+MAILGUN_API_BASE = os.environ.get("MAILGUN_API_BASE", "https://api.mailgun.net/v3")  # point at a fake server in tests
+MAILGUN_CONNECT_TIMEOUT = float(os.environ.get("MAILGUN_CONNECT_TIMEOUT", 3.05))
+MAILGUN_READ_TIMEOUT = float(os.environ.get("MAILGUN_READ_TIMEOUT", 10))
+MAILGUN_POOL_SIZE = int(os.environ.get("MAILGUN_POOL_SIZE", 10))  # keep-alive connections, one per concurrent sender
+MAILGUN_MAX_BATCH = 1000  # Mailgun accepts at most 1000 recipients per batch message
+
 
 class MailGunException(Exception):
     def __init__(self, message: str):
         super().__init__(message)
 
 
+def _build_session() -> Session:
+    # one session for the whole process, connections (and their TLS handshakes) are reused between emails
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAILGUN_POOL_SIZE, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 class Mailgun:
     MAILGUN_DOMAIN = os.environ.get("MAILGUN_DOMAIN", None)  # can be None
     MAILGUN_API_KEY = os.environ.get("MAILGUN_API_KEY", None)  # can be None
     FROM_TITLE = "Stores REST API"
     FROM_EMAIL = os.environ.get("FROM_EMAIL")
 
+    session = _build_session()
+    # called with (seconds, "ok" | "error" | "exception") after every API call, metrics.init_app sets it
+    latency_observer: Optional[Callable[[float, str], None]] = None
+
     @classmethod
     def send_confirmation_email(cls, email: List[str], subject: str, text: str, html: str) -> Response:
+        return cls._send({"to": email, "subject": subject, "text": text, "html": html})
+
+    @classmethod
+    def send_batch_email(
+        cls, recipient_variables: Dict[str, Dict[str, str]], subject: str, text: str, html: str
+    ) -> List[Response]:
+        """
+        Sends one personalised email to each recipient with as few API calls as possible.
+
+        `recipient_variables` maps each address to its variables, referenced in `text`/`html` as
+        `%recipient.<name>%`, e.g. {"jo@mail.com": {"link": "..."}} with text "Confirm here: %recipient.link%".
+        Every recipient only sees their own address in the To: header.
+        """
+        emails = list(recipient_variables)
+        responses = []
+        for start in range(0, len(emails), MAILGUN_MAX_BATCH):
+            chunk = emails[start:start + MAILGUN_MAX_BATCH]
+            responses.append(cls._send({
+                "to": chunk,
+                "subject": subject,
+                "text": text,
+                "html": html,
+                "recipient-variables": json.dumps({email: recipient_variables[email] for email in chunk}),
+            }))
+        return responses
+
+    @classmethod
+    def _send(cls, data: Dict) -> Response:
         if cls.MAILGUN_DOMAIN is None:
             raise MailGunException(getText("mailgun_failed_load_domain"))
 
         if cls.MAILGUN_API_KEY is None:
-            raise MailGunException(getText("mailgun_failed_load_domain"))
+            raise MailGunException(getText("mailgun_failed_load_api_key"))
 
-        response = post(
-            f"https://api.mailgun.net/v3/{cls.MAILGUN_DOMAIN}/messages",
-            auth=("api", cls.MAILGUN_API_KEY),
-            data={
-                "from": f"{cls.FROM_TITLE} <{cls.FROM_EMAIL}>",
-                "to": email,
-                "subject": subject,
-                "text": text,
-                "html": html
-            }
-        )
+        started = perf_counter()
+        try:
+            response = cls.session.post(
+                f"{MAILGUN_API_BASE}/{cls.MAILGUN_DOMAIN}/messages",
+                auth=("api", cls.MAILGUN_API_KEY),
+                data={"from": f"{cls.FROM_TITLE} <{cls.FROM_EMAIL}>", **data},
+                timeout=(MAILGUN_CONNECT_TIMEOUT, MAILGUN_READ_TIMEOUT),
+            )
+        except Exception:
+            cls._observe(started, "exception")    # timeouts, connection errors
+            raise
+        cls._observe(started, "ok" if response.status_code == 200 else "error")
 
         if response.status_code != 200:
             raise MailGunException(getText("mailgun_error_sending_email"))
 
         return response
+
+    @classmethod
+    def _observe(cls, started: float, outcome: str) -> None:
+        if cls.latency_observer is not None:
+            cls.latency_observer(perf_counter() - started, outcome)
@@ -0,0 +1,141 @@
+"""
+libs.outbox
+Delivers the emails queued in the `outbox_email` table (models.outbox) in the background, so sending mail never
+happens on a request thread.
+
+An OutboxWorker polls for due emails, claims each one with a conditional UPDATE (several workers or processes can run
+side by side without sending anything twice) and hands it to a bounded thread pool. Failed deliveries are retried with
+exponential backoff until OUTBOX_MAX_ATTEMPTS is reached.
+
+The transport is picked with the MAIL_TRANSPORT env variable: 'mailgun' (default) or 'stub', which only records the
+emails and is meant for tests and local development.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional
+
+from flask import Flask
+
+from libs.log import get_logger
+from libs.mail_gun import Mailgun
+from models.outbox import OutboxEmailModel
+
+OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", 4))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", 1.0))
+BACKOFF_BASE = 5  # seconds, doubles on each failed attempt
+BACKOFF_MAX = 3600
+
+logger = get_logger(__name__)
+
+
+def backoff(attempts: int) -> int:
+    return min(BACKOFF_BASE * 2 ** attempts, BACKOFF_MAX)
+
+
+RecipientVariables = Optional[Dict[str, Dict[str, str]]]
+
+
+class MailTransport:
+    def send(
+        self, recipients: List[str], subject: str, text: str, html: str, recipient_variables: RecipientVariables = None
+    ) -> None:
+        """With `recipient_variables` every recipient gets their own personalised copy."""
+        raise NotImplementedError
+
+
+class MailgunTransport(MailTransport):
+    def send(
+        self, recipients: List[str], subject: str, text: str, html: str, recipient_variables: RecipientVariables = None
+    ) -> None:
+        if recipient_variables:
+            Mailgun.send_batch_email(recipient_variables, subject, text, html)
+        else:
+            Mailgun.send_confirmation_email(recipients, subject, text, html)
+
+
+class StubTransport(MailTransport):
+    """Keeps the emails in memory instead of sending them."""
+
+    def __init__(self):
+        self.sent = []
+        self._lock = Lock()
+
+    def send(
+        self, recipients: List[str], subject: str, text: str, html: str, recipient_variables: RecipientVariables = None
+    ) -> None:
+        with self._lock:
+            self.sent.append({
+                "to": recipients, "subject": subject, "text": text, "html": html,
+                "recipient_variables": recipient_variables,
+            })
+
+
+def default_transport() -> MailTransport:
+    if os.environ.get("MAIL_TRANSPORT", "mailgun") == "stub":
+        return StubTransport()
+    return MailgunTransport()
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        app: Flask,
+        transport: Optional[MailTransport] = None,
+        max_workers: int = OUTBOX_WORKERS,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+    ):
+        self.app = app
+        self.transport = transport or default_transport()
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="outbox")
+        self._stopped = Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = Thread(target=self.run, name="outbox-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def run(self) -> None:
+        """Polls until stopped, use it directly to run the worker in the foreground."""
+        while not self._stopped.is_set():
+            try:
+                sent = self.deliver_due()
+            except Exception:
+                logger.exception("outbox poll failed")
+                sent = 0
+            if not sent:  # keep draining while there is a backlog
+                self._stopped.wait(self.poll_interval)
+
+    def deliver_due(self) -> int:
+        """Delivers one batch of due emails and waits for it, returns how many were attempted."""
+        with self.app.app_context():
+            due = OutboxEmailModel.find_due_ids(self.max_workers * 4)
+            claimed = [_id for _id in due if OutboxEmailModel.claim(_id)]
+        # the pool never runs more than max_workers deliveries at once
+        list(self._pool.map(self._deliver, claimed))
+        return len(claimed)
+
+    def _deliver(self, _id: int) -> None:
+        with self.app.app_context():
+            email = OutboxEmailModel.find_by_id(_id)
+            try:
+                self.transport.send(
+                    email.recipient_list, email.subject, email.text, email.html, email.recipient_variable_map
+                )
+            except Exception as err:
+                retry_in = backoff(email.attempts)
+                logger.warning(
+                    "email delivery failed",
+                    extra={"fields": {"id": _id, "attempts": email.attempts + 1, "retry_in": retry_in, "error": str(err)}},
+                )
+                email.mark_failed(str(err), retry_in)
+            else:
+                email.mark_sent()
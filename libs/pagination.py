@@ -0,0 +1,99 @@
+"""
+libs.pagination
+Keyset (cursor) pagination helpers shared by the list resources.
+
+Pages are ordered by primary key, a client asks for `?limit=<n>&after=<last id seen>` and gets back the next
+`after` cursor alongside the rows, so every page is a cheap `WHERE id > :after ORDER BY id LIMIT :n` index scan
+no matter how deep into the table it is.
+
+`?stream=1` skips paging altogether and streams the whole table as chunked JSON.
+
+Pages sorted by something else than the id (e.g. /items/search?sort=price) need the whole sort key of the last row,
+it travels as an opaque `after` cursor, see encode_cursor.
+"""
+import base64
+import json
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+from flask import Response, request, stream_with_context
+
+from libs.fast_json import dumps
+from libs.strings import getText
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500  # rows fetched per round trip from the server side cursor
+
+TRUTHY = ("1", "true", "yes", "on")
+
+
+class PaginationError(ValueError):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def parse_limit() -> int:
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError(getText("pagination_invalid_limit", MAX_PAGE_SIZE))
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PaginationError(getText("pagination_invalid_limit", MAX_PAGE_SIZE))
+    return limit
+
+
+def parse_page_args() -> Tuple[int, Optional[int]]:
+    """Read `limit` and `after` from the query string, raises PaginationError on bad input."""
+    limit = parse_limit()
+    after = request.args.get("after")
+    if after is None or after == "":
+        return limit, None
+    try:
+        return limit, int(after)
+    except ValueError:
+        raise PaginationError(getText("pagination_invalid_cursor"))
+
+
+def encode_cursor(values: Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values), separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[Tuple]:
+    """The `size` values of an encode_cursor cursor, None when there is none, raises PaginationError if it is bad."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise PaginationError(getText("pagination_invalid_sort_cursor"))
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, (int, float, str)) for v in values):
+        raise PaginationError(getText("pagination_invalid_sort_cursor"))
+    return tuple(values)
+
+
+def wants_stream() -> bool:
+    return request.args.get("stream", "").lower() in TRUTHY
+
+
+def next_cursor(rows: list, limit: int) -> Optional[int]:
+    """`rows` are dumped rows (dicts)."""
+    # a short page means we reached the end of the table
+    if len(rows) < limit:
+        return None
+    return rows[-1]["id"]
+
+
+def stream_json(key: str, rows: Iterable, dump: Callable[[object], dict] = None) -> Response:
+    """
+    Stream `{"<key>": [...]}` one row at a time, only the current chunk of rows is ever held in memory.
+    Without `dump` the rows must already be dicts.
+    """
+    def generate():
+        yield '{"%s": [' % key
+        separator = ""
+        for row in rows:
+            yield separator + dumps(dump(row) if dump else row)
+            separator = ","
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,158 @@
+"""
+libs.passwords
+Password hashing with scrypt (hashlib, so no extra dependency), run in a bounded process pool.
+
+A KDF is CPU bound on purpose. Running it in the request thread would hold the GIL and stall every other request
+of the worker, so hashes are computed in PASSWORD_HASH_WORKERS separate processes and at most PASSWORD_HASH_MAX_PENDING
+hashes may be queued at once, callers wait up to PASSWORD_HASH_TIMEOUT seconds for a slot and then get a
+PasswordHasherBusy. PASSWORD_HASH_WORKERS=0 hashes in the calling thread, handy for tests. The pool uses the
+'spawn' start method, so a script that hashes must keep its own code under `if __name__ == "__main__":`.
+
+The cost is set with PASSWORD_SCRYPT_N / _R / _P. The parameters are stored with each hash, so raising them only
+affects new hashes and `needs_rehash` tells when a stored hash should be upgraded (UserModel does it on login).
+
+Hashes look like `scrypt$<n>$<r>$<p>$<salt>$<key>`, anything else is taken for a legacy plaintext password.
+"""
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import List
+
+from libs.strings import getText
+
+SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.environ.get("PASSWORD_SCRYPT_R", 8))
+SCRYPT_P = int(os.environ.get("PASSWORD_SCRYPT_P", 1))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 4 * max(PASSWORD_HASH_WORKERS, 1)))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+PREFIX = "scrypt"
+KEY_LENGTH = 32
+
+
+class PasswordHasherBusy(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+# module level functions, so the pool can pickle them
+def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # maxmem has to fit 128 * n * r bytes, the OpenSSL default of 32 MiB is too small for n >= 2 ** 15
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=KEY_LENGTH)
+
+
+def _hash(password: str, n: int, r: int, p: int) -> str:
+    salt = os.urandom(16)
+    key = _derive(password, salt, n, r, p)
+    return "$".join((PREFIX, str(n), str(r), str(p), _b64(salt), _b64(key)))
+
+
+def _verify(password: str, encoded: str) -> bool:
+    if not encoded.startswith(PREFIX + "$"):
+        return hmac.compare_digest(password.encode(), encoded.encode())  # legacy plaintext password
+
+    _, n, r, p, salt, key = encoded.split("$")
+    derived = _derive(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(derived, base64.b64decode(key))
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        n: int = SCRYPT_N,
+        r: int = SCRYPT_R,
+        p: int = SCRYPT_P,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+        timeout: float = PASSWORD_HASH_TIMEOUT,
+    ):
+        self.n, self.r, self.p = n, r, p
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = Lock()
+        self._dummy_hash = None
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.n, self.r, self.p)
+
+    def hash_many(self, passwords: List[str]) -> List[str]:
+        """
+        For bulk imports: every hash takes a pending slot like hash() does, and at most one per worker is queued at
+        a time, so the other slots stay free and a /login or /register hash never waits behind the whole batch.
+        """
+        if self.workers == 0:
+            return [_hash(password, self.n, self.r, self.p) for password in passwords]
+
+        pool = self._get_pool()
+        in_flight = BoundedSemaphore(self.workers)
+        futures = []
+        for password in passwords:
+            in_flight.acquire()
+            if not self._slots.acquire(timeout=self.timeout):
+                in_flight.release()
+                raise PasswordHasherBusy(getText("password_hasher_busy"))   # the ones submitted finish on their own
+            try:
+                future = pool.submit(_hash, password, self.n, self.r, self.p)
+            except BaseException:
+                self._slots.release()
+                in_flight.release()
+                raise
+            future.add_done_callback(lambda _, window=in_flight: (self._slots.release(), window.release()))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def verify(self, password: str, encoded: str) -> bool:
+        return self._run(_verify, password, encoded)
+
+    def verify_unknown(self, password: str) -> bool:
+        """
+        For a username that doesn't exist: as slow as verify() against a real hash, and always False, so the
+        response time doesn't tell which usernames exist.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(os.urandom(16).hex())    # nobody knows this password, not even us
+        self.verify(password, self._dummy_hash)
+        return False
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return encoded.split("$")[:4] != [PREFIX, str(self.n), str(self.r), str(self.p)]
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _run(self, fn, *args):
+        if self.workers == 0:
+            return fn(*args)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy(getText("password_hasher_busy"))
+        try:
+            return self._get_pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # created on first use, so it is never inherited through a fork (gunicorn preload)
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,38 @@
+"""
+libs.query_counter
+Counts the SQL statements sent to the database, handy for catching N+1 queries.
+
+    with count_queries() as counter:
+        client.get("/stores")
+    assert counter.count == 2
+"""
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+
+from db import db
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine=None) -> Iterator[QueryCounter]:
+    """Needs an app context unless an engine is passed in."""
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._before_cursor_execute)
@@ -0,0 +1,137 @@
+"""
+libs.rate_limit
+Request throttling for flask_restful resources, see rate_limits.py for the limiter and the rules the app uses.
+
+    @classmethod
+    @limiter.limit(by_ip(20, 60), by_json_field("username", 5, 60))
+    def post(cls): ...
+
+Every rule is checked before the resource method runs, so a throttled request costs no database or hashing work.
+Once any rule runs out the request gets a 429 with a Retry-After header.
+
+Backends:
+- MemoryRateLimitBackend: a token bucket per key, in this process only (each worker has its own buckets)
+- SharedRateLimitBackend: a sliding window counter in a shared key/value store such as Redis, so every worker counts
+  against the same limit. It only needs `incr`, `expire` and `get`, libs.cache.LocalStore implements them too.
+"""
+import math
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from time import monotonic, time
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from flask import current_app, request
+
+from libs.strings import getText
+
+
+class Rule(NamedTuple):
+    name: str
+    key: Callable[[], Optional[str]]     # None skips the rule for this request
+    capacity: int                        # requests allowed...
+    period: float                        # ...every `period` seconds
+
+
+def by_ip(capacity: int, period: float) -> Rule:
+    return Rule("ip", lambda: request.remote_addr, capacity, period)
+
+
+def by_json_field(field: str, capacity: int, period: float) -> Rule:
+    def key() -> Optional[str]:
+        data = request.get_json(silent=True)
+        value = data.get(field) if isinstance(data, dict) else None
+        return str(value).lower() if value else None
+    return Rule(field, key, capacity, period)
+
+
+class RateLimitBackend:
+    def hit(self, key: str, capacity: int, period: float) -> Tuple[bool, float]:
+        """Counts one request against `key`, returns (allowed, seconds until the next one would be allowed)."""
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()   # key -> [tokens, last refill], least recently used first
+        self._lock = Lock()
+
+    def hit(self, key: str, capacity: int, period: float) -> Tuple[bool, float]:
+        rate = capacity / period
+        now = monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+                # a forgotten bucket would have refilled by now anyway, dropping the oldest only forgives a little
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / rate
+
+
+class SharedRateLimitBackend(RateLimitBackend):
+    def __init__(self, client, prefix: str = "ratelimit"):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key: str, capacity: int, period: float) -> Tuple[bool, float]:
+        now = time()
+        window = int(now // period)
+        elapsed = now - window * period
+
+        current_key = f"{self.prefix}:{key}:{window}"
+        count = self.client.incr(current_key)   # atomic, so concurrent workers never lose a hit
+        if count == 1:
+            self.client.expire(current_key, math.ceil(period * 2))   # still needed as the previous window
+        previous = int(self.client.get(f"{self.prefix}:{key}:{window - 1}") or 0)
+
+        # the previous window counts for the part of it that still overlaps the sliding window
+        weight = 1 - elapsed / period
+        if previous * weight + count <= capacity:
+            return True, 0.0
+        if count > capacity or not previous:
+            return False, period - elapsed
+        # wait until enough of the previous window has slid out
+        return False, max(0.0, period * (1 - (capacity - count) / previous) - elapsed)
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+
+    def check(self, scope: str, rules: Tuple[Rule, ...]) -> Optional[float]:
+        """None when the request may go ahead, otherwise how many seconds to wait."""
+        retry_after = None
+        for rule in rules:
+            key = rule.key()
+            if key is None:
+                continue
+            allowed, wait = self.backend.hit(f"{scope}:{rule.name}:{key}", rule.capacity, rule.period)
+            if not allowed:
+                retry_after = max(wait, retry_after or 0.0)
+        return retry_after
+
+    def limit(self, *rules: Rule):
+        def decorator(fn):
+            scope = fn.__qualname__
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not current_app.config.get("RATE_LIMIT_ENABLED", True):
+                    return fn(*args, **kwargs)
+                retry_after = self.check(scope, rules)
+                if retry_after is not None:
+                    seconds = max(1, math.ceil(retry_after))
+                    return {"message": getText("rate_limited", seconds)}, 429, {"Retry-After": str(seconds)}
+                return fn(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,17 @@
+"""
+libs.request_memo
+Memoization that only lives for the current request, for values that are read several times while handling one
+request but must not leak into the next one.
+
+Outside of a request `request_memo` returns None and callers just compute the value every time.
+"""
+from typing import Optional
+
+from flask import g, has_request_context
+
+
+def request_memo(namespace: str) -> Optional[dict]:
+    if not has_request_context():
+        return None
+    memos = g.setdefault("_request_memo", {})
+    return memos.setdefault(namespace, {})
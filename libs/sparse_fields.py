@@ -0,0 +1,91 @@
+"""
+libs.sparse_fields
+Sparse fieldsets: `?fields=name,price` asks for just those fields, `?fields=name,items.name` reaches into a nested
+list (a bare `items` keeps all of its fields).
+
+Resources narrow the work to match, not only the response: the row based paths select just the columns asked for,
+the ORM paths use `load_only` and a schema built with `only=`. Those schemas are built once per (schema, fields)
+combination and kept, building a SQLAlchemyAutoSchema is far more expensive than dumping with it.
+"""
+from functools import lru_cache
+from importlib import import_module
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from flask import request
+
+from libs.strings import getText
+
+FIELDS_PARAM = "fields"
+SCHEMA_CACHE_SIZE = 256
+
+Fields = Optional[FrozenSet[str]]  # None: every field
+
+
+class FieldsError(ValueError):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def requested_fields(allowed: Iterable[str]) -> Fields:
+    """The fields asked for with ?fields=, None if the parameter is absent, raises FieldsError on an unknown field."""
+    raw = request.args.get(FIELDS_PARAM)
+    if raw is None:
+        return None
+    allowed = tuple(allowed)
+    fields = frozenset(field.strip() for field in raw.split(",") if field.strip())
+    if not fields or not fields <= set(allowed):
+        raise FieldsError(getText("fields_invalid", ", ".join(allowed)))
+    return fields
+
+
+def split_fields(fields: Fields) -> Tuple[Set[str], Dict[str, Optional[Set[str]]]]:
+    """{"name", "items.name"} -> ({"name", "items"}, {"items": {"name"}}), a bare "items" maps to None (all)."""
+    top, nested = set(), {}
+    for field in fields or ():
+        parent, _, child = field.partition(".")
+        top.add(parent)
+        if child:
+            nested.setdefault(parent, set()).add(child)
+    for parent in top & set(fields or ()):  # asked for as a whole, that wins over any "parent.child"
+        nested[parent] = None
+    return top, nested
+
+
+def columns_for(fields: Optional[Iterable[str]], available: Iterable[str], required: Iterable[str] = ()):
+    """The columns to SELECT for `fields`, in `available` order plus the `required` ones, None (all) without fields."""
+    if fields is None:
+        return None
+    wanted = {*fields, *required}
+    return tuple(column for column in available if column in wanted)
+
+
+def project(dumped: dict, fields: Fields) -> dict:
+    """The requested part of an already dumped dict (e.g. from a cache), nested lists included."""
+    if fields is None:
+        return dumped
+    top, nested = split_fields(fields)
+    projected = {}
+    for field, value in dumped.items():  # in the dump's order, not the set's
+        if field not in top:
+            continue
+        children = nested.get(field)
+        if children is not None and isinstance(value, list):
+            value = [{child: row[child] for child in children} for row in value]
+        projected[field] = value
+    return projected
+
+
+def project_all(rows: List[dict], fields: Fields) -> List[dict]:
+    """project() for every row, e.g. to drop the id a page was read with only for its cursor."""
+    return rows if fields is None else [project(row, fields) for row in rows]
+
+
+def sparse_schema(path: str, fields: Fields, many: bool = False):
+    """A "<module>:<class>" schema instance limited to `fields` (`only=`), shared by every request asking for them."""
+    return _build_schema(path, tuple(sorted(fields)) if fields else None, many)
+
+
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def _build_schema(path: str, only: Optional[Tuple[str, ...]], many: bool):
+    module, name = path.split(":")
+    return getattr(import_module(module), name)(only=only, many=many)
@@ -0,0 +1,183 @@
+"""
+libs.static_assets
+Static files and pages prepared once, so serving them is a lookup rather than work per request.
+
+- AssetRegistry reads a directory at startup and serves each file under a fingerprinted name
+  (confirmation_page.css -> confirmation_page.<hash>.css) with a year long, immutable Cache-Control: a changed file
+  gets a new URL, so browsers never have to revalidate. The gzip and brotli variants are compressed up front (brotli
+  only with the optional `brotli` package) and picked by Accept-Encoding.
+- PrerenderedPage renders a template once with a placeholder for its one per request variable, a request only
+  escapes the value and joins it between the pre-rendered parts. The parts are deflated up front as well, each as
+  self-contained blocks, so the gzip variant is those blocks with the value in between as an uncompressed ("stored")
+  block, plus a CRC: no compression work per request.
+"""
+import hashlib
+import mimetypes
+import os
+import struct
+import zlib
+from typing import Dict, List, NamedTuple, Optional
+from uuid import uuid4
+
+from flask import Flask, Response, abort, render_template, request, url_for
+from markupsafe import Markup, escape
+
+from libs.conditional import is_not_modified, not_modified, validator_headers
+
+try:
+    import brotli
+except ImportError:  # optional, pip install brotli
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+SKIPPED = ("__pycache__", "__init__.py")    # the static directory is also a package
+GZIP_WBITS = 31  # zlib with a gzip header and trailer
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff"  # deflate, no flags nor mtime, max compression
+STORED_BLOCK_MAX = 0xFFFF
+
+
+class Asset(NamedTuple):
+    mimetype: str
+    digest: str
+    variants: Dict[str, bytes]  # content coding ("identity", "gzip", "br") -> body
+
+    def etag(self, coding: str) -> str:
+        """A strong ETag per variant, as RFC 7232 wants, so a cache never mixes up the encodings."""
+        return self.digest if coding == "identity" else f"{self.digest}-{coding}"
+
+
+def compressed_variants(data: bytes, mimetype: str) -> Dict[str, bytes]:
+    """identity, plus the gzip/brotli encodings that actually come out smaller."""
+    variants = {"identity": data}
+    if not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return variants
+    candidates = {"gzip": gzip(data)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(data, quality=11)
+    variants.update((coding, body) for coding, body in candidates.items() if len(body) < len(data))
+    return variants
+
+
+def gzip(data: bytes) -> bytes:
+    compressor = zlib.compressobj(9, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def deflate_segment(data: bytes, last: bool) -> bytes:
+    """Raw deflate blocks that don't refer back to anything before them, only the last one marked final."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+
+
+def stored_blocks(data: bytes) -> bytes:
+    """`data` as non-final uncompressed deflate blocks, to go between byte aligned segments."""
+    return b"".join(
+        b"\x00" + struct.pack("<HH", len(chunk), len(chunk) ^ 0xFFFF) + chunk
+        for chunk in (data[start:start + STORED_BLOCK_MAX] for start in range(0, len(data), STORED_BLOCK_MAX))
+    )
+
+
+def negotiate(codings) -> str:
+    """The best of `codings` the client accepts, brotli first, "identity" when it accepts none of them."""
+    for coding in ("br", "gzip"):
+        if coding in codings and request.accept_encodings[coding]:
+            return coding
+    return "identity"
+
+
+def encoded_response(body: bytes, coding: str, mimetype: str, headers: Dict[str, str] = None) -> Response:
+    response = Response(body, mimetype=mimetype, headers=headers)
+    if coding != "identity":
+        response.headers["Content-Encoding"] = coding
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+class AssetRegistry:
+    def __init__(self, directory: str, endpoint: str = "asset"):
+        self.directory = directory
+        self.endpoint = endpoint
+        self._assets: Dict[str, Asset] = {}  # fingerprinted name -> asset
+        self._names: Dict[str, str] = {}  # file name -> fingerprinted name
+        self._texts: Dict[str, str] = {}
+
+    def load(self) -> None:
+        assets, names, texts = {}, {}, {}
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [name for name in dirs if name not in SKIPPED]
+            for name in files:
+                if name in SKIPPED or name.endswith((".py", ".pyc")):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, "rb") as file:
+                    data = file.read()
+                filename = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                stem, extension = os.path.splitext(filename)
+                mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                names[filename] = f"{stem}.{digest}{extension}"
+                assets[names[filename]] = Asset(mimetype, digest, compressed_variants(data, mimetype))
+                if mimetype.startswith("text/"):
+                    texts[filename] = data.decode("utf-8")
+        self._assets, self._names, self._texts = assets, names, texts  # swapped whole, readers never see a partial load
+
+    def url(self, filename: str) -> str:
+        """The fingerprinted URL of a file, for templates: {{ asset_url("confirmation_page.css") }}."""
+        return url_for(self.endpoint, filename=self._names[filename])
+
+    def inline(self, filename: str) -> Markup:
+        """A text file's content, for templates: <style>{{ asset_inline("confirmation_page.css") }}</style>."""
+        return Markup(self._texts[filename])
+
+    def serve(self, filename: str) -> Response:
+        asset = self._assets.get(filename)
+        if asset is None:
+            abort(404)
+        coding = negotiate(asset.variants)
+        etag = asset.etag(coding)
+        if is_not_modified(etag):
+            response = not_modified(etag)
+            response.headers["Vary"] = "Accept-Encoding"
+            return response
+        headers = {"Cache-Control": IMMUTABLE, **validator_headers(etag)}
+        return encoded_response(asset.variants[coding], coding, asset.mimetype, headers)
+
+    def init_app(self, app: Flask, url_path: str = "/assets") -> None:
+        self.load()
+        app.add_url_rule(f"{url_path}/<path:filename>", self.endpoint, self.serve)
+        app.jinja_env.globals.update(asset_url=self.url, asset_inline=self.inline)
+
+
+class PrerenderedPage:
+    def __init__(self, template: str, slot: str, mimetype: str = "text/html"):
+        self.template = template
+        self.slot = slot
+        self.mimetype = mimetype
+        self._parts: Optional[List[str]] = None
+        self._encoded: List[bytes] = []
+        self._deflated: List[bytes] = []
+
+    def compile(self, app: Flask) -> None:
+        """Renders the template through Jinja, the only time it is, with a placeholder in place of the slot."""
+        placeholder = f"__{self.slot}_{uuid4().hex}__"
+        with app.test_request_context():     # for url_for() and the template globals
+            parts = render_template(self.template, **{self.slot: placeholder}).split(placeholder)
+        encoded = [part.encode() for part in parts]
+        self._deflated = [deflate_segment(part, last=index == len(encoded) - 1) for index, part in enumerate(encoded)]
+        self._parts, self._encoded = parts, encoded
+
+    def render(self, value: str) -> str:
+        """Same output as render_template(template, slot=value), autoescaping included."""
+        return str(escape(value)).join(self._parts)
+
+    def response(self, value: str) -> Response:
+        if negotiate(("gzip",)) == "gzip":   # brotli has no stored blocks to splice, a page is gzip or nothing
+            return encoded_response(self._gzip(value), "gzip", self.mimetype)
+        return encoded_response(self.render(value).encode(), "identity", self.mimetype)
+
+    def _gzip(self, value: str) -> bytes:
+        escaped = str(escape(value)).encode()
+        body = escaped.join(self._encoded)
+        trailer = struct.pack("<II", zlib.crc32(body), len(body) & 0xFFFFFFFF)
+        return GZIP_HEADER + stored_blocks(escaped).join(self._deflated) + trailer
@@ -1,24 +1,151 @@
 """
 libs.strings
-By default, uses 'en-gb.json' file inside the 'strings' top-level folder
+User facing messages, one '<locale>.json' file per language inside the 'strings' top-level folder.
 
-If language changes, set 'libs.strings.default_locale' and run 'libs.strings.refresh()'
+Every locale is loaded once into a Catalogue: the message names map to a position shared by all locales and each
+locale is a tuple of templates, so adding a language costs one tuple rather than another dict. Templates are parsed
+once when they are loaded: one with a single plain field ("... '{}' ...") becomes its two literal halves joined around
+the argument, a third faster than `str.format`, which parses the template again on every call. Any other template
+(several fields, a format spec or a conversion) keeps its bound `str.format`, a Python loop over pre-split parts
+measured slower than that.
 
+During a request the locale is the best match of the Accept-Language header, otherwise it is the default locale.
+A message missing from a locale falls back to the default locale.
+
+`refresh()` (or `reload_if_changed()`, which create_app calls before each request when STRINGS_AUTO_RELOAD is set)
+builds a complete new Catalogue and then swaps it in with a single assignment, readers never see a half loaded one.
 """
 import json
+import os
+import sys
+import threading
+import time
+from string import Formatter
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from flask import g, has_request_context, request
+
+STRINGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "strings")
+RELOAD_CHECK_INTERVAL = 1.0  # seconds between mtime checks in reload_if_changed
+
+default_locale = os.environ.get("DEFAULT_LOCALE", "en-gb")
+
+
+class Catalogue:
+    __slots__ = ("index", "templates", "formatters", "locales", "default", "mtimes")
+
+    def __init__(self, directory: str, default: str):
+        catalogues = {}
+        self.mtimes = {}
+        for filename in sorted(os.listdir(directory)):
+            locale, extension = os.path.splitext(filename)
+            if extension != ".json":
+                continue
+            path = os.path.join(directory, filename)
+            self.mtimes[path] = os.stat(path).st_mtime
+            with open(path, encoding="utf-8") as f:
+                catalogues[locale.lower()] = json.load(f)
+        if default not in catalogues:
+            raise LookupError(f"no strings for the default locale '{default}' in {directory}")
+
+        names = sorted(set().union(*catalogues.values()))
+        self.index: Mapping[str, int] = MappingProxyType({sys.intern(name): i for i, name in enumerate(names)})
+        self.templates: Dict[str, Tuple[Optional[str], ...]] = {}
+        self.formatters: Dict[str, Tuple[Optional[Callable[..., str]], ...]] = {}
+        for locale, strings in catalogues.items():
+            templates = tuple(self._compile(locale, name, strings.get(name)) for name in names)
+            self.templates[locale] = templates
+            self.formatters[locale] = tuple(
+                _formatter(template) if template is not None else None for template in templates
+            )
+        self.templates = MappingProxyType(self.templates)
+        self.formatters = MappingProxyType(self.formatters)
+        self.locales = tuple(catalogues)
+        self.default = default
 
-default_locale = "en-gb"
-cached_strings = {}
+    @staticmethod
+    def _compile(locale: str, name: str, template: Optional[str]) -> Optional[str]:
+        if template is None:
+            return None
+        try:
+            list(Formatter().parse(template))    # a broken template fails here rather than in the middle of a request
+        except ValueError as e:
+            raise ValueError(f"bad template '{name}' in locale '{locale}': {e}") from None
+        return sys.intern(template)
+
+    def lookup(self, table: Mapping[str, tuple], name: str, locale: str):
+        i = self.index[name]
+        value = table.get(locale, table[self.default])[i]
+        return value if value is not None else table[self.default][i]
+
+
+def _formatter(template: str) -> Callable[..., str]:
+    """What getText calls to format `template`, see the module docstring."""
+    halves, fields = ["", ""], []
+    for literal, name, spec, conversion in Formatter().parse(template):    # "{{" and "}}" come out unescaped
+        halves[len(fields) > 0] += literal
+        if name is not None:
+            fields.append((name, spec, conversion))
+    if len(fields) != 1:
+        return template.format
+    (name, spec, conversion), halves = fields[0], tuple(halves)
+    positional = name in ("", "0")
+    if spec or conversion or not (positional or name.isidentifier()):   # "{0.attr}", "{:>10}", "{!r}"...
+        return template.format
+    if positional:
+        return lambda *args, **kwargs: format(args[0], "").join(halves)
+    return lambda *args, **kwargs: format(kwargs[name], "").join(halves)
+
+
+_catalogue = Catalogue(STRINGS_DIR, default_locale)
+_reload_lock = threading.Lock()
+_next_reload_check = 0.0
 
 
 def refresh():
-    global cached_strings
-    with open(f"strings/{default_locale}.json") as f:
-        cached_strings = json.load(f)
+    """Reloads every locale from disk, also picks up a new `default_locale`."""
+    global _catalogue
+    with _reload_lock:
+        _catalogue = Catalogue(STRINGS_DIR, default_locale)
+
+
+def reload_if_changed() -> bool:
+    """Cheap enough to call on every request: looks at the files at most once per RELOAD_CHECK_INTERVAL."""
+    global _next_reload_check
+    now = time.monotonic()
+    if now < _next_reload_check:
+        return False
+    _next_reload_check = now + RELOAD_CHECK_INTERVAL
+
+    catalogue = _catalogue
+    try:
+        current = {
+            os.path.join(STRINGS_DIR, filename): os.stat(os.path.join(STRINGS_DIR, filename)).st_mtime
+            for filename in os.listdir(STRINGS_DIR) if filename.endswith(".json")
+        }
+    except OSError:
+        return False
+    if current == catalogue.mtimes:
+        return False
+    refresh()
+    return True
 
 
-def getText(name):
-    return cached_strings[name]
+def current_locale() -> str:
+    """The Accept-Language best match for this request (worked out once per request), else the default locale."""
+    catalogue = _catalogue
+    if not has_request_context():
+        return catalogue.default
+    locale = g.get("_strings_locale")
+    if locale is None:
+        match = request.accept_languages.best_match(catalogue.locales)
+        locale = g._strings_locale = match.lower() if match else catalogue.default
+    return locale
 
 
-refresh()
+def getText(name, *args, **kwargs):
+    catalogue = _catalogue    # one read of the global, a concurrent refresh() can't mix two catalogues
+    if args or kwargs:
+        return catalogue.lookup(catalogue.formatters, name, current_locale())(*args, **kwargs)
+    return catalogue.lookup(catalogue.templates, name, current_locale())
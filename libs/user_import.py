@@ -0,0 +1,78 @@
+"""
+libs.user_import
+Registers users in bulk, behind POST /users/import and `flask import-users`.
+
+The rows are validated with UserSchema(many=True), usernames and emails are checked against the database with a few
+set based queries (not two lookups per user), then the users go in `chunk_size` at a time: the passwords are hashed
+across the whole hasher pool, and the users, their confirmations and one batched confirmation email (see
+OutboxEmailModel.enqueue_batch) are committed together. A bad row, or a chunk that fails to insert, doesn't stop the
+rest, the report lists the errors by row index next to the users created.
+"""
+import os
+from typing import Dict, List
+
+from db import db
+from libs.lazy_schema import LazySchema
+from libs.log import get_logger
+from libs.passwords import PasswordHasherBusy, hasher
+from libs.strings import getText
+from models.user import UserModel
+
+USER_IMPORT_CHUNK_SIZE = int(os.environ.get("USER_IMPORT_CHUNK_SIZE", 500))
+
+user_list_schema = LazySchema("schemas.user:UserSchema", many=True)
+logger = get_logger(__name__)
+
+
+class ImportReport:
+    def __init__(self):
+        self.created: Dict[int, int] = {}  # row index -> user id
+        self.errors: Dict[int, dict] = {}  # row index -> {field: [messages]}
+
+    def to_dict(self) -> dict:
+        return {
+            "created": {str(index): _id for index, _id in self.created.items()},
+            "errors": {str(index): self.errors[index] for index in sorted(self.errors)},
+        }
+
+
+def import_users(rows: List[dict], chunk_size: int = USER_IMPORT_CHUNK_SIZE) -> ImportReport:
+    report = ImportReport()
+    report.errors.update(user_list_schema.validate(rows))
+    valid = [(index, row) for index, row in enumerate(rows) if index not in report.errors]
+
+    taken_usernames, taken_emails = UserModel.find_taken(
+        (row["username"] for _, row in valid), (row["email"] for _, row in valid)
+    )
+    accepted = []
+    for index, row in valid:
+        # taken_* also collect the rows accepted so far, so a repeat within the batch loses to its first occurrence
+        if row["username"] in taken_usernames:
+            report.errors[index] = {"username": [getText("user_username_exists")]}
+        elif row["email"] in taken_emails:
+            report.errors[index] = {"email": [getText("user_email_exists")]}
+        else:
+            taken_usernames.add(row["username"])
+            taken_emails.add(row["email"])
+            accepted.append((index, row))
+
+    for start in range(0, len(accepted), chunk_size):
+        chunk = accepted[start:start + chunk_size]
+        try:
+            users = user_list_schema.load([row for _, row in chunk])
+            for user, password in zip(users, hasher.hash_many([user.password for user in users])):
+                user.password = password
+            ids = UserModel.bulk_register(users)
+        except PasswordHasherBusy as err:
+            failure = {"password": [str(err)]}
+        except Exception:
+            db.session.rollback()
+            logger.exception("failed to import users", extra={"fields": {"first_row": chunk[0][0], "count": len(chunk)}})
+            failure = {"_schema": [getText("user_error_creating")]}
+        else:
+            report.created.update((index, _id) for (index, _), _id in zip(chunk, ids))
+            continue
+        report.errors.update((index, failure) for index, _ in chunk)
+
+    logger.info("users imported", extra={"fields": {"created": len(report.created), "failed": len(report.errors)}})
+    return report
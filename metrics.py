@@ -0,0 +1,109 @@
+"""
+metrics.py
+
+The metrics the app records, served in the Prometheus text format on GET /metrics (see libs.metrics).
+
+- http_request_duration_seconds{method, route, status}: per route latency, route is the URL rule (/item/<string:name>)
+  so the number of series stays bounded
+- sql_queries_per_request / sql_seconds_per_request{route}: how much database work each request does, from
+  SQLAlchemy cursor events on every engine (the replica's too)
+- sql_queries_total / sql_seconds_total: the same, including work done outside requests (the outbox worker, CLI)
+- mailgun_request_duration_seconds{outcome}: Mailgun API call latency, reported through Mailgun.latency_observer
+- cache_hits / cache_misses / cache_hit_ratio{cache}: from caches.cache_stats(), read when scraped
+"""
+from time import perf_counter
+
+from flask import Flask, Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from caches import cache_stats
+from libs.mail_gun import Mailgun
+from libs.metrics import Counter, Gauge, Histogram, Registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling a request.", ("method", "route", "status"),
+))
+REQUEST_QUERIES = registry.register(Histogram(
+    "sql_queries_per_request", "SQL statements executed while handling a request.", ("route",), QUERY_COUNT_BUCKETS,
+))
+REQUEST_SQL_TIME = registry.register(Histogram(
+    "sql_seconds_per_request", "Time spent in SQL statements while handling a request.", ("route",),
+))
+SQL_QUERIES = registry.register(Counter("sql_queries_total", "SQL statements executed."))
+SQL_TIME = registry.register(Counter("sql_seconds_total", "Time spent in SQL statements."))
+MAILGUN_LATENCY = registry.register(Histogram(
+    "mailgun_request_duration_seconds", "Time spent in Mailgun API calls.", ("outcome",),
+))
+
+
+def _cache_stat(stat: str):
+    return lambda: {(name,): stats[stat] for name, stats in cache_stats().items()}
+
+
+for _stat, _documentation in (
+    ("hits", "Cache lookups answered from the cache."),
+    ("misses", "Cache lookups that went to the database."),
+    ("hit_ratio", "Share of cache lookups answered from the cache."),
+):
+    registry.register(Gauge(f"cache_{_stat}", _documentation, ("cache",), _cache_stat(_stat)))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["query_started"].pop()
+    SQL_QUERIES.inc()
+    SQL_TIME.inc(amount=elapsed)
+    if has_request_context():
+        g._sql_queries = g.get("_sql_queries", 0) + 1
+        g._sql_seconds = g.get("_sql_seconds", 0.0) + elapsed
+
+
+def _failed_cursor_execute(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def _start_timer():
+    g._request_started = perf_counter()
+
+
+def _record_request(response: Response) -> Response:
+    started = g.get("_request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(perf_counter() - started, request.method, route, str(response.status_code))
+        REQUEST_QUERIES.observe(g.get("_sql_queries", 0), route)
+        REQUEST_SQL_TIME.observe(g.get("_sql_seconds", 0.0), route)
+    return response
+
+
+def metrics_view() -> Response:
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+SQL_LISTENERS = (
+    ("before_cursor_execute", _before_cursor_execute),
+    ("after_cursor_execute", _after_cursor_execute),
+    ("handle_error", _failed_cursor_execute),
+)
+
+
+def init_app(app: Flask) -> None:
+    """Installs every hook, importing this module alone costs nothing per statement nor per email."""
+    for identifier, listener in SQL_LISTENERS:     # on the Engine class, so every engine (the replica's too)
+        if not event.contains(Engine, identifier, listener):
+            event.listen(Engine, identifier, listener)
+    Mailgun.latency_observer = MAILGUN_LATENCY.observe
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -1,16 +1,20 @@
 from time import time
+from typing import Optional
 from uuid import uuid4
 
-from db import db
+from db import db, replica_read
+from libs.request_memo import request_memo
 
 CONFIRMATION_EXPIRATION_DELTA = 1800  # 30 minutes
+MOST_RECENT_MEMO = "most_recent_confirmation"  # user id -> ConfirmationModel, see UserModel.most_recent_confirmation
 
 
 class ConfirmationModel(db.Model):
     __tablename__ = 'confirmation'
+    __table_args__ = (db.Index("ix_confirmation_user_id_expire_at", "user_id", "expire_at"),)  # most recent per user
 
     id = db.Column(db.String(50), primary_key=True)
-    expire_at = db.Column(db.Integer, nullable=False)
+    expire_at = db.Column(db.Integer, nullable=False, index=True)  # index used by purge_expired
     confirmed = db.Column(db.Boolean, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     user = db.relationship("UserModel")  # one to many
@@ -23,6 +27,7 @@ class ConfirmationModel(db.Model):
         self.confirmed = False  # u can set this as default
 
     @classmethod
+    @replica_read
     def find_by_id(cls, _id: str) -> "ConfirmationModel":
         return cls.query.filter_by(id=_id).first()
 
@@ -31,14 +36,45 @@ class ConfirmationModel(db.Model):
         return time() > self.expire_at  # current time > time when created + confirmation delta
 
     def force_to_expire(self) -> None:
+        """Not committed here, goes out with the caller's next commit."""
         if not self.expired:
             self.expire_at = int(time())
-            self.save_to_db()
+            db.session.add(self)
+
+    @classmethod
+    def purge_expired(cls, batch_size: int = 1000, before: Optional[int] = None) -> int:
+        """
+        Deletes expired confirmations that were never confirmed, `batch_size` rows per transaction so locks stay short.
+        Confirmed ones are kept, UserLogin reads them to know the user is confirmed. Returns how many rows went.
+        """
+        cutoff = int(time()) if before is None else before
+        purged = 0
+        while True:
+            ids = [_id for _id, in db.session.query(cls.id)
+                   .filter(cls.expire_at < cutoff, cls.confirmed.is_(False))
+                   .order_by(cls.expire_at)
+                   .limit(batch_size)]
+            if not ids:
+                return purged
+
+            cls.query.filter(cls.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            purged += len(ids)
+            if len(ids) < batch_size:
+                return purged
 
     def save_to_db(self) -> None:
         db.session.add(self)
         db.session.commit()
+        self.forget_most_recent(self.user_id)
 
     def delete_from_db(self) -> None:
         db.session.delete(self)
         db.session.commit()
+        self.forget_most_recent(self.user_id)
+
+    @staticmethod
+    def forget_most_recent(user_id: int) -> None:
+        memo = request_memo(MOST_RECENT_MEMO)
+        if memo is not None:
+            memo.pop(user_id, None)
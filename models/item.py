@@ -1,37 +1,222 @@
 import datetime
-from typing import List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from db import db
+from sqlalchemy.orm import load_only
 
+from caches import item_cache, store_cache
+from db import db, replica_read
+from libs.fast_json import row_to_dict
+from libs.log import get_logger
+from models.mixins import KeysetPageMixin
 
-class ItemModel(db.Model):
+logger = get_logger(__name__)
+
+
+def make_request_id(item_id: int) -> str:
+    return str(datetime.date.today().strftime("%b%y%d")).upper() + "-" + str(item_id)
+
+
+class ItemModel(KeysetPageMixin, db.Model):
     __tablename__ = "item"
+    __table_args__ = (
+        # /items/search: (store, price range / price order) and (price range / price order), id breaks ties for the
+        # keyset cursor; the unique index on name serves the name prefix, which is searched as a range
+        db.Index("ix_item_store_id_price_id", "store_id", "price", "id"),
+        db.Index("ix_item_price_id", "price", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False, unique=True)
     price = db.Column(db.Float(precision=2), nullable=False)
     request_id = db.Column(db.String(15))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
     store_id = db.Column(db.Integer, db.ForeignKey("store.id"), nullable=False)
     store = db.relationship("StoreModel")
 
+    # what ItemSchema dumps, the *_rows methods read just these columns and skip building ORM objects
+    ROW_COLUMNS = ("id", "name", "price", "request_id", "store_id", "updated_at")
+    SEARCH_SORTS = ("id", "name", "price")   # "-<column>" sorts descending
+
     @classmethod
+    @replica_read
     def find_by_name(cls, name: str) -> "ItemModel":
         return cls.query.filter_by(name=name).first()  # SELECT * FROM items WHERE name=name LIMIT 1
 
     @classmethod
+    @replica_read
     def find_all(cls) -> List["ItemModel"]:
         return cls.query.all()
 
+    @classmethod
+    def find_existing_names(cls, names: Iterable[str]) -> List[str]:
+        return [name for name, in db.session.query(cls.name).filter(cls.name.in_(list(names)))]
+
+    @classmethod
+    @replica_read
+    def find_by_store_ids(
+        cls, store_ids: Iterable[int], columns: Optional[Iterable[str]] = None
+    ) -> Dict[int, List["ItemModel"]]:
+        """Loads the items of many stores in one query, grouped by store id, just `columns` (load_only) if given."""
+        grouped = {_id: [] for _id in store_ids}
+        if not grouped:
+            return grouped
+        query = cls.query
+        if columns is not None:
+            query = query.options(load_only(*{*columns, "store_id"}))
+        for item in query.filter(cls.store_id.in_(grouped)).order_by(cls.id):
+            grouped[item.store_id].append(item)
+        return grouped
+
+    @classmethod
+    @replica_read
+    def find_page_rows(cls, limit: int, after: Optional[int] = None, columns: Iterable[str] = None) -> List[Dict]:
+        """Same rows as find_page, already as dicts shaped like ItemSchema's dump (of just `columns` if given)."""
+        query = cls._rows_query(columns)
+        if after is not None:
+            query = query.filter(cls.id > after)
+        return [row_to_dict(row) for row in query.limit(limit)]
+
+    @classmethod
+    @replica_read
+    def find_rows_by_store_ids(
+        cls, store_ids: Iterable[int], columns: Optional[Iterable[str]] = None
+    ) -> Dict[int, List[Dict]]:
+        grouped = {_id: [] for _id in store_ids}
+        if not grouped:
+            return grouped
+        columns = cls.ROW_COLUMNS if columns is None else tuple(columns)
+        query = cls._rows_query(columns if "store_id" in columns else ("store_id", *columns))
+        for row in query.filter(cls.store_id.in_(grouped)):
+            row = row_to_dict(row)
+            store_id = row["store_id"] if "store_id" in columns else row.pop("store_id")
+            grouped[store_id].append(row)
+        return grouped
+
+    @classmethod
+    @replica_read
+    def search_rows(cls, limit: int, **filters) -> List[Dict]:
+        return [row_to_dict(row) for row in cls.search_query(**filters).limit(limit)]
+
+    @classmethod
+    def search_query(
+        cls,
+        name_prefix: Optional[str] = None,
+        text: Optional[str] = None,
+        store_id: Optional[int] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: str = "id",
+        after: Optional[Tuple] = None,
+        columns: Optional[Iterable[str]] = None,
+    ):
+        """
+        `after` holds the search_key values of the last row of the previous page, those columns are always selected
+        along with `columns` (default: all of ROW_COLUMNS).
+        """
+        descending = sort.startswith("-")
+        key = tuple(getattr(cls, name) for name in cls.search_key(sort))
+
+        selected = cls.ROW_COLUMNS if columns is None else (*cls.search_key(sort), *columns)
+        query = db.session.query(*(getattr(cls, name) for name in dict.fromkeys(selected)))
+        if name_prefix:
+            # name >= 'ab' AND name < 'ac' is a plain range on the name index on every database, LIKE 'ab%' only is
+            # with the right collation/operator class
+            query = query.filter(cls.name >= name_prefix, cls.name < name_prefix[:-1] + chr(ord(name_prefix[-1]) + 1))
+        if text:
+            query = query.filter(cls._text_match(text))
+        if store_id is not None:
+            query = query.filter(cls.store_id == store_id)
+        if min_price is not None:
+            query = query.filter(cls.price >= min_price)
+        if max_price is not None:
+            query = query.filter(cls.price <= max_price)
+        if after is not None:
+            bound = db.tuple_(*key) if len(key) > 1 else key[0]
+            value = db.tuple_(*after) if len(key) > 1 else after[0]
+            query = query.filter(bound < value if descending else bound > value)
+        return query.order_by(*(part.desc() if descending else part for part in key))
+
+    @staticmethod
+    def search_key(sort: str) -> Tuple[str, ...]:
+        """The columns that order (and page) a search, ids and names are unique, prices need the id to break ties."""
+        column = sort.lstrip("-")
+        return (column,) if column in ("id", "name") else (column, "id")
+
+    @classmethod
+    def _text_match(cls, text: str):
+        if db.engine.dialect.name == "postgresql":  # the replica, if any, runs the same database
+            # served by ix_item_name_fts, created below
+            return db.func.to_tsvector("simple", cls.name).op("@@")(db.func.plainto_tsquery("simple", text))
+        return cls.name.ilike(f"%{text}%")  # no full text index elsewhere, a scan
+
+    @classmethod
+    def iter_rows(cls, chunk_size: int, columns: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        rows = cls._rows_query(columns).execution_options(stream_results=True).yield_per(chunk_size)
+        return (row_to_dict(row) for row in rows)
+
+    @classmethod
+    def _rows_query(cls, columns: Optional[Iterable[str]] = None):
+        columns = cls.ROW_COLUMNS if columns is None else columns
+        return db.session.query(*(getattr(cls, column) for column in columns)).order_by(cls.id)
+
     def save_to_db(self) -> None:
         db.session.add(self)
-        print("BEFORE COMMIT: ->", self.id)
+        if self.id is None:
+            db.session.flush()  # runs the INSERT so we know the id, still inside the same transaction
+        self.request_id = make_request_id(self.id)
+        if self.store is not None:  # the resources check store_id first, a dangling one is left to the foreign key
+            self.store.touch()  # the store's dump nests its items, so its version moves too
+        _id, names, store_names = self.id, [self.name], self._store_names([self])   # read before commit() expires them
         db.session.commit()
-        print("AFTER COMMIT: ->", self.id)
-        self.request_id = str(datetime.date.today().strftime("%b%y%d")).upper() + "-" + str(self.id)
-        db.session.add(self)
+        logger.debug("item saved", extra={"fields": {"id": _id}})
+        self.invalidate_caches(names, store_names)
+
+    @classmethod
+    def bulk_create(cls, items: List["ItemModel"], dump: Callable[[List["ItemModel"]], Any] = None) -> Any:
+        """
+        Inserts all the items in a single transaction. Returns dump(items) when given, run before the commit expires
+        the items, since afterwards each one would be reloaded with its own SELECT; the items themselves otherwise.
+        """
+        db.session.add_all(items)
+        db.session.flush()
+        for item in items:
+            item.request_id = make_request_id(item.id)
+        for store in {item.store for item in items} - {None}:
+            store.touch()
+        names, store_names = [item.name for item in items], cls._store_names(items)  # no reload per item after commit
+        dumped = dump(items) if dump is not None else items    # ids and request_ids are in since the flush
         db.session.commit()
+        logger.debug("items saved", extra={"fields": {"count": len(items)}})
+        cls.invalidate_caches(names, store_names)
+        return dumped
 
     def delete_from_db(self) -> None:
+        names, store_names = [self.name], self._store_names([self])
+        if self.store is not None:
+            self.store.touch()
         db.session.delete(self)
         db.session.commit()
+        self.invalidate_caches(names, store_names)
+
+    @staticmethod
+    def _store_names(items: Iterable["ItemModel"]) -> Set[str]:
+        return {item.store.name for item in items if item.store is not None}
+
+    @staticmethod
+    def invalidate_caches(names: Iterable[str], store_names: Iterable[str]) -> None:
+        """Takes the keys rather than reading them off the items, which a commit has expired."""
+        for name in names:   # the item is cached on its own and nested in its store's dump
+            item_cache.delete(name)
+        for store_name in store_names:
+            store_cache.delete(store_name)
+
+
+# full text index for /items/search?q=, only Postgres has one we can declare here (SQLite would need an FTS5 table)
+db.event.listen(
+    ItemModel.__table__,
+    "after_create",
+    db.DDL("CREATE INDEX ix_item_name_fts ON item USING gin (to_tsvector('simple', name))").execute_if(
+        dialect="postgresql"
+    ),
+)
@@ -0,0 +1,25 @@
+from typing import List, Optional, Tuple
+
+from db import db, replica_read
+
+
+class KeysetPageMixin:
+    """Keyset pagination over the primary key, for models with an `id` and an `updated_at` column."""
+
+    @classmethod
+    @replica_read
+    def find_page(cls, limit: int, after: Optional[int] = None) -> List:
+        query = cls.query.order_by(cls.id)  # keyset pagination, walks the primary key index
+        if after is not None:
+            query = query.filter(cls.id > after)
+        return query.limit(limit).all()
+
+    @classmethod
+    @replica_read
+    def page_version(cls, limit: int, after: Optional[int] = None) -> Tuple:
+        """(count, sum of ids, latest updated_at) of a page, changes whenever a row of the page does."""
+        page = db.session.query(cls.id, cls.updated_at).order_by(cls.id)
+        if after is not None:
+            page = page.filter(cls.id > after)
+        page = page.limit(limit).subquery()
+        return db.session.query(db.func.count(page.c.id), db.func.sum(page.c.id), db.func.max(page.c.updated_at)).one()
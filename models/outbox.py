@@ -0,0 +1,122 @@
+import json
+from time import time
+from typing import Dict, List, Optional
+
+from db import db
+
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_LEASE = 300  # seconds a claimed email is left alone before another worker may retry it
+OUTBOX_MAX_BATCH = 1000  # recipients per batch email, Mailgun's limit
+
+
+class OutboxEmailModel(db.Model):
+    """An email waiting to be delivered by libs.outbox.OutboxWorker."""
+    __tablename__ = "outbox_email"
+    __table_args__ = (db.Index("ix_outbox_email_status_next_attempt_at", "status", "next_attempt_at"),)
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"  # gave up after OUTBOX_MAX_ATTEMPTS
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # comma separated
+    recipient_variables = db.Column(db.Text)  # JSON, only for batch emails (each recipient gets their own copy)
+    subject = db.Column(db.String(200), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+    next_attempt_at = db.Column(db.Integer, nullable=False)
+    last_error = db.Column(db.String(255))
+
+    def __init__(self, recipients: List[str], subject: str, text: str, html: str, **kwargs):
+        super().__init__(**kwargs)
+        self.recipients = ",".join(recipients)
+        self.subject = subject
+        self.text = text
+        self.html = html
+        self.status = self.PENDING
+        self.attempts = 0
+        self.next_attempt_at = int(time())
+
+    @property
+    def recipient_list(self) -> List[str]:
+        return self.recipients.split(",")
+
+    @property
+    def recipient_variable_map(self) -> Optional[Dict[str, Dict[str, str]]]:
+        return json.loads(self.recipient_variables) if self.recipient_variables else None
+
+    @classmethod
+    def enqueue(cls, recipients: List[str], subject: str, text: str, html: str) -> "OutboxEmailModel":
+        email = cls(recipients, subject, text, html)
+        email.save_to_db()
+        return email
+
+    @classmethod
+    def enqueue_batch(
+        cls, recipient_variables: Dict[str, Dict[str, str]], subject: str, text: str, html: str
+    ) -> List["OutboxEmailModel"]:
+        """
+        One email per OUTBOX_MAX_BATCH recipients, personalised with `%recipient.<name>%` (see
+        Mailgun.send_batch_email). Not committed here, goes out with the caller's next commit.
+        """
+        addresses = list(recipient_variables)
+        emails = []
+        for start in range(0, len(addresses), OUTBOX_MAX_BATCH):
+            chunk = addresses[start:start + OUTBOX_MAX_BATCH]
+            email = cls(chunk, subject, text, html)
+            email.recipient_variables = json.dumps({address: recipient_variables[address] for address in chunk})
+            emails.append(email)
+        db.session.add_all(emails)
+        return emails
+
+    @classmethod
+    def find_by_id(cls, _id: int) -> "OutboxEmailModel":
+        return cls.query.filter_by(id=_id).first()
+
+    @classmethod
+    def find_due_ids(cls, limit: int) -> List[int]:
+        """Pending emails whose backoff is over, plus claimed ones whose lease ran out (their worker died)."""
+        rows = db.session.query(cls.id).filter(
+            cls.status.in_((cls.PENDING, cls.SENDING)),
+            cls.next_attempt_at <= int(time()),
+        ).order_by(cls.next_attempt_at).limit(limit).all()
+        return [_id for _id, in rows]
+
+    @classmethod
+    def claim(cls, _id: int) -> bool:
+        """Atomically takes an email for delivery, False if another worker got there first."""
+        now = int(time())
+        claimed = cls.query.filter(
+            cls.id == _id,
+            cls.status.in_((cls.PENDING, cls.SENDING)),
+            cls.next_attempt_at <= now,
+        ).update({"status": cls.SENDING, "next_attempt_at": now + OUTBOX_LEASE}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def mark_sent(self) -> None:
+        self.status = self.SENT
+        self.attempts += 1
+        self.last_error = None
+        self.save_to_db()
+
+    def mark_failed(self, error: str, retry_in: int) -> None:
+        self.attempts += 1
+        self.last_error = error[:255]
+        if self.attempts >= OUTBOX_MAX_ATTEMPTS:
+            self.status = self.FAILED
+        else:
+            self.status = self.PENDING
+            self.next_attempt_at = int(time()) + retry_in
+        self.save_to_db()
+
+    def save_to_db(self) -> None:
+        db.session.add(self)
+        db.session.commit()
+
+    def delete_from_db(self) -> None:
+        db.session.delete(self)
+        db.session.commit()
@@ -0,0 +1,26 @@
+from time import time
+
+from db import db
+
+
+class RevokedTokenModel(db.Model):
+    __tablename__ = "revoked_token"
+
+    jti = db.Column(db.String(36), primary_key=True)  # primary key, so lookups are a single index probe
+    expires_at = db.Column(db.Integer, nullable=False, index=True)  # the token's `exp`, used to purge old rows
+
+    @classmethod
+    def is_revoked(cls, jti: str) -> bool:
+        return db.session.query(cls.jti).filter_by(jti=jti).first() is not None  # SELECT jti ... WHERE jti=jti LIMIT 1
+
+    @classmethod
+    def revoke(cls, jti: str, expires_at: int) -> None:
+        db.session.merge(cls(jti=jti, expires_at=expires_at))  # merge, so revoking twice is harmless
+        db.session.commit()
+
+    @classmethod
+    def purge_expired(cls) -> int:
+        """Deletes revocations of tokens that expired anyway, returns how many rows went."""
+        deleted = cls.query.filter(cls.expires_at < int(time())).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
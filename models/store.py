@@ -1,28 +1,130 @@
-from typing import List
+import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
 
-from db import db
+from sqlalchemy.orm import load_only
 
+from caches import store_cache
+from db import db, replica_read
+from libs.fast_json import row_to_dict
+from models.item import ItemModel
+from models.mixins import KeysetPageMixin
 
-class StoreModel(db.Model):
+
+class StoreModel(KeysetPageMixin, db.Model):
     __tablename__ = "store"
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False, unique=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    ROW_COLUMNS = ("id", "name", "updated_at")  # StoreSchema's dump, minus the nested items
 
     items = db.relationship("ItemModel", lazy="dynamic")  # this is lazy loading for one => many relationship
 
+    # dynamic relationships can't be eager loaded, so StoreSchema dumps `loaded_items` instead,
+    # which uses the items fetched by `prefetch_items` when there are any, saving one query per store
+    @property
+    def loaded_items(self) -> List[ItemModel]:
+        prefetched = getattr(self, "_prefetched_items", None)
+        if prefetched is not None:
+            return prefetched
+        return self.items.all()
+
+    @classmethod
+    def prefetch_items(
+        cls, stores: Iterable["StoreModel"], item_columns: Optional[Iterable[str]] = None
+    ) -> List["StoreModel"]:
+        stores = list(stores)
+        # SELECT * FROM item WHERE store_id IN (...)
+        grouped = ItemModel.find_by_store_ids((store.id for store in stores), item_columns)
+        for store in stores:
+            store._prefetched_items = grouped[store.id]
+        return stores
+
     @classmethod
+    @replica_read
     def find_by_name(cls, name) -> "StoreModel":
         return cls.query.filter_by(name=name).first()  # SELECT * FROM items WHERE name=name LIMIT 1
 
     @classmethod
+    def find_missing_ids(cls, ids: Iterable[int]) -> List[int]:
+        """The ids with no store, in one query, read on the primary as it guards a write."""
+        ids = set(ids)
+        found = {_id for _id, in db.session.query(cls.id).filter(cls.id.in_(ids))}
+        return sorted(ids - found)
+
+    @classmethod
+    @replica_read
     def find_all(cls) -> List["StoreModel"]:
         return cls.query.all()
 
+    @classmethod
+    @replica_read
+    def find_page_rows(
+        cls,
+        limit: int,
+        after: Optional[int] = None,
+        columns: Optional[Iterable[str]] = None,
+        item_columns: Optional[Iterable[str]] = None,
+        with_items: bool = True,
+    ) -> List[dict]:
+        """
+        Same stores as find_page, as dicts shaped like StoreSchema's dump, with two queries and no ORM objects.
+        `columns`/`item_columns` narrow the SELECTs (the store id is always read), without items it is one query.
+        """
+        columns = cls.ROW_COLUMNS if columns is None else ("id", *(column for column in columns if column != "id"))
+        query = db.session.query(*(getattr(cls, column) for column in columns)).order_by(cls.id)
+        if after is not None:
+            query = query.filter(cls.id > after)
+        stores = [row_to_dict(row) for row in query.limit(limit)]
+        if not with_items:
+            return stores
+
+        items = ItemModel.find_rows_by_store_ids((store["id"] for store in stores), item_columns)
+        for store in stores:
+            store["items"] = items[store["id"]]
+        return stores
+
+    @classmethod
+    def iter_all(cls, chunk_size: int, columns: Optional[Iterable[str]] = None) -> Iterator["StoreModel"]:
+        # server side cursor, only `chunk_size` rows are buffered at any time
+        query = cls.query if columns is None else cls.query.options(load_only(*columns))
+        return query.order_by(cls.id).execution_options(stream_results=True).yield_per(chunk_size)
+
+    @classmethod
+    def iter_all_with_items(
+        cls,
+        chunk_size: int,
+        columns: Optional[Iterable[str]] = None,
+        item_columns: Optional[Iterable[str]] = None,
+        with_items: bool = True,
+    ) -> Iterator["StoreModel"]:
+        if not with_items:
+            return iter(cls.iter_all(chunk_size, columns))
+        return cls._iter_with_items(chunk_size, columns, item_columns)
+
+    @classmethod
+    def _iter_with_items(cls, chunk_size: int, columns, item_columns) -> Iterator["StoreModel"]:
+        # one items query per chunk of stores rather than per store
+        stores = iter(cls.iter_all(chunk_size, columns))
+        while True:
+            chunk = cls.prefetch_items(islice(stores, chunk_size), item_columns)
+            if not chunk:
+                return
+            yield from chunk
+
+    def touch(self) -> None:
+        """Bumps updated_at (and so the ETag) when one of the items changes, committed with the item."""
+        self.updated_at = datetime.datetime.utcnow()
+
     def save_to_db(self) -> None:
         db.session.add(self)
         db.session.commit()
+        store_cache.delete(self.name)
 
     def delete_from_db(self) -> None:
+        name = self.name
         db.session.delete(self)
         db.session.commit()
+        store_cache.delete(name)
@@ -1,12 +1,22 @@
-from typing import Dict, Union
+from typing import Iterable, List, Set, Tuple
 
-from flask import request, url_for
+from flask import current_app, request, url_for
+from sqlalchemy.orm import load_only
 
-from db import db
-from requests import Response
+from db import db, replica_read
 
-from libs.mail_gun import Mailgun
-from models.confirmation import ConfirmationModel
+from libs.confirmation_token import make_token
+from libs.passwords import hasher
+from libs.request_memo import request_memo
+from models.confirmation import MOST_RECENT_MEMO, ConfirmationModel
+from models.outbox import OutboxEmailModel
+
+
+IN_CHUNK_SIZE = 500  # values per IN (...) list, keeps clear of the bound parameter limits
+
+CONFIRMATION_SUBJECT = "Registration Confirmation"
+CONFIRMATION_TEXT = "Please click the link to confirm your registration: {link}"
+CONFIRMATION_HTML = '<html>Please click the link to confirm your registration: <a href="{link}">{link}<a/> </html>'
 
 
 class UserModel(db.Model):
@@ -14,8 +24,10 @@ class UserModel(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), nullable=False, unique=True)
-    password = db.Column(db.String(80), nullable=False)
+    password = db.Column(db.String(255), nullable=False)  # scrypt hash, see libs.passwords
     email = db.Column(db.String(80), nullable=False, unique=True)
+    # set when the user confirms, by a token or a confirmation row (which also keeps its own `confirmed` flag)
+    confirmed = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     confirmation = db.relationship("ConfirmationModel", lazy="dynamic", cascade="all, delete-orphan")
 
@@ -26,9 +38,44 @@ class UserModel(db.Model):
     # print(user.confirmation
 
     # allow us to do this   UserModel.most_recent_confirmation, rather than UserModel.most_recent_confirmation()
+    # memoized for the rest of the request, ConfirmationModel.save_to_db clears it
     @property
     def most_recent_confirmation(self) -> ConfirmationModel:
-        return self.confirmation.order_by(db.desc(ConfirmationModel.expire_at)).first()
+        memo = request_memo(MOST_RECENT_MEMO)
+        if memo is not None and self.id in memo:
+            return memo[self.id]
+
+        confirmation = self.confirmation.order_by(db.desc(ConfirmationModel.expire_at)).first()
+        if memo is not None:
+            memo[self.id] = confirmation
+        return confirmation
+
+    @property
+    def is_confirmed(self) -> bool:
+        if self.confirmed:
+            return True
+        confirmation = self.most_recent_confirmation
+        return bool(confirmation and confirmation.confirmed)
+
+    @classmethod
+    def mark_confirmed(cls, _id: int) -> bool:
+        """One idempotent UPDATE, True if this call confirmed the user (False: already confirmed or no such user)."""
+        updated = cls.query.filter(cls.id == _id, cls.confirmed.is_(False)) \
+            .update({cls.confirmed: True}, synchronize_session=False)
+        db.session.commit()
+        return updated == 1
+
+    def set_password(self, password: str) -> None:
+        self.password = hasher.hash(password)
+
+    def check_password(self, password: str) -> bool:
+        if not hasher.verify(password, self.password):
+            return False
+        # the hash parameters were raised (or it is a legacy plaintext password), upgrade it while we know the password
+        if hasher.needs_rehash(self.password):
+            self.set_password(password)
+            self.save_to_db()
+        return True
 
     def save_to_db(self) -> None:
         db.session.add(self)
@@ -47,17 +94,98 @@ class UserModel(db.Model):
         return cls.query.filter_by(email=email).first()
 
     @classmethod
-    def find_by_id(cls, _id: int) -> "UserModel":
-        return cls.query.filter_by(id=_id).first()
+    def find_taken(cls, usernames: Iterable[str], emails: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+        """The usernames and the emails (of the ones given) that already belong to someone, one query per chunk each."""
+        return cls._taken(cls.username, list(usernames)), cls._taken(cls.email, list(emails))
+
+    @staticmethod
+    def _taken(column, values: List[str]) -> Set[str]:
+        taken = set()
+        for start in range(0, len(values), IN_CHUNK_SIZE):
+            chunk = values[start:start + IN_CHUNK_SIZE]
+            taken.update(value for value, in db.session.query(column).filter(column.in_(chunk)))
+        return taken
+
+    @classmethod
+    @replica_read
+    def find_by_id(cls, _id: int, columns: Iterable[str] = None) -> "UserModel":
+        """`columns` limits the SELECT (load_only), any other column is loaded on first access."""
+        query = cls.query if columns is None else cls.query.options(load_only(*columns))
+        return query.filter_by(id=_id).first()
+
+    # the two below load the user and their most recent confirmation in a single query
+    @classmethod
+    @replica_read
+    def find_by_username_with_confirmation(cls, username) -> "UserModel":
+        return cls._find_with_confirmation(cls.username == username)
 
-    def send_confirmation_email(self) -> Response:
+    @classmethod
+    @replica_read
+    def find_by_id_with_confirmation(cls, _id: int) -> "UserModel":
+        return cls._find_with_confirmation(cls.id == _id)
+
+    @classmethod
+    def _find_with_confirmation(cls, criterion) -> "UserModel":
+        # SELECT * FROM user LEFT JOIN confirmation ON ... WHERE ... ORDER BY expire_at DESC LIMIT 1
+        row = db.session.query(cls, ConfirmationModel) \
+            .outerjoin(ConfirmationModel, ConfirmationModel.user_id == cls.id) \
+            .filter(criterion) \
+            .order_by(db.desc(ConfirmationModel.expire_at)) \
+            .first()
+        if row is None:
+            return None
+
+        user, confirmation = row
+        memo = request_memo(MOST_RECENT_MEMO)
+        if memo is not None:
+            memo[user.id] = confirmation
+        return user
+
+    def confirmation_id(self) -> str:
+        """A signed token in token mode, otherwise the id of the most recent confirmation row."""
+        if current_app.config.get("CONFIRMATION_MODE") == "token":
+            return make_token(self.id, self.email)
+        return self.most_recent_confirmation.id
+
+    def confirmation_link(self, confirmation_id: str = None) -> str:
         # root http://localhost:5000
         # confirmation is the name of the route i.e UserConfirm in lowercase
         # hence we have http://localhost:5000/user_confirm/1
-        link = request.url_root[:-1] + url_for("confirmation", confirmation_id=self.most_recent_confirmation.id)
+        confirmation_id = confirmation_id or self.confirmation_id()
+        return request.url_root[:-1] + url_for("confirmation", confirmation_id=confirmation_id)
 
-        subject = "Registration Confirmation"
-        text = f"Please click the link to confirm your registration: {link}"
-        html = f'<html>Please click the link to confirm your registration: <a href="{link}">{link}<a/> </html>'
-        return Mailgun.send_confirmation_email([self.email], subject, text, html)
+    def send_confirmation_email(self) -> OutboxEmailModel:
+        link = self.confirmation_link()
+        # queued, libs.outbox.OutboxWorker does the actual sending in the background
+        return OutboxEmailModel.enqueue(
+            [self.email], CONFIRMATION_SUBJECT, CONFIRMATION_TEXT.format(link=link), CONFIRMATION_HTML.format(link=link)
+        )
 
+    @classmethod
+    def bulk_register(cls, users: List["UserModel"]) -> List[int]:
+        """
+        Inserts the users (passwords already hashed), their confirmations and batched confirmation emails in one
+        transaction, see libs.user_import. Returns the new ids, read before the commit expires every user.
+        """
+        db.session.add_all(users)
+        db.session.flush()  # assigns the ids the links need
+
+        links = {}
+        if current_app.config.get("CONFIRMATION_MODE") == "token":
+            for user in users:
+                links[user.email] = user.confirmation_link()
+        else:
+            confirmations = [ConfirmationModel(user.id) for user in users]
+            db.session.add_all(confirmations)
+            for user, confirmation in zip(users, confirmations):
+                links[user.email] = user.confirmation_link(confirmation.id)
+
+        OutboxEmailModel.enqueue_batch(
+            {email: {"link": link} for email, link in links.items()},
+            CONFIRMATION_SUBJECT,
+            CONFIRMATION_TEXT.format(link="%recipient.link%"),  # filled in per recipient by Mailgun
+            CONFIRMATION_HTML.format(link="%recipient.link%"),
+        )
+        ids = [user.id for user in users]
+        db.session.commit()
+        return ids
@@ -0,0 +1,23 @@
+"""
+pages.py
+
+The static assets and the pre-rendered HTML pages the app serves, prepared in init_app (see libs.static_assets).
+
+- /assets/<name>.<hash>.<ext>: the files of static/, fingerprinted, immutable, gzip/brotli compressed up front
+- confirmation_page: the page shown after a successful confirmation, its CSS inlined, Jinja only runs at startup
+"""
+import os
+
+from flask import Flask
+
+from libs.static_assets import AssetRegistry, PrerenderedPage
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+assets = AssetRegistry(STATIC_DIR)
+confirmation_page = PrerenderedPage("confirmation_page.html", slot="email")
+
+
+def init_app(app: Flask) -> None:
+    assets.init_app(app)    # first, the pages use its template globals
+    confirmation_page.compile(app)
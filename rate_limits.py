@@ -0,0 +1,45 @@
+"""
+rate_limits.py
+
+The limiter guarding /login and /register against credential stuffing and signup floods, see libs.rate_limit.
+
+RATE_LIMIT_BACKEND picks where the counters live:
+- memory (default): per process, so with N workers a client gets up to N times the limit
+- redis: shared by every worker, needs the `redis` package and RATE_LIMIT_REDIS_URL
+- shared-local: the shared code path against an in-process stand-in for Redis
+
+Limits are "<requests>/<seconds>", e.g. LOGIN_RATE_LIMIT_PER_USERNAME = 5/60.
+"""
+import os
+from typing import Tuple
+
+from libs.cache import LocalStore
+from libs.rate_limit import MemoryRateLimitBackend, RateLimiter, SharedRateLimitBackend, by_ip, by_json_field
+
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+
+
+def _parse(variable: str, default: str) -> Tuple[int, float]:
+    capacity, period = (os.environ.get(variable) or default).split("/")
+    return int(capacity), float(period)
+
+
+def _make_backend():
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimitBackend()
+    if RATE_LIMIT_BACKEND == "redis":
+        import redis  # optional dependency, only needed for this backend
+        return SharedRateLimitBackend(redis.Redis.from_url(os.environ["RATE_LIMIT_REDIS_URL"]))
+    return SharedRateLimitBackend(LocalStore())
+
+
+limiter = RateLimiter(_make_backend())
+
+# the username rule slows down guessing one account from many addresses, the ip rule one address trying many accounts
+LOGIN_LIMITS = (
+    by_ip(*_parse("LOGIN_RATE_LIMIT_PER_IP", "20/60")),
+    by_json_field("username", *_parse("LOGIN_RATE_LIMIT_PER_USERNAME", "5/60")),
+)
+REGISTER_LIMITS = (
+    by_ip(*_parse("REGISTER_RATE_LIMIT_PER_IP", "5/60")),
+)
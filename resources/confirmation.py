@@ -1,23 +1,29 @@
-import traceback
 from time import time
 
-from flask import make_response, render_template
+from flask import current_app
 from flask_restful import Resource
 
-from libs.mail_gun import MailGunException
+from db import primary_read
+from libs.confirmation_token import ConfirmationTokenExpired, ConfirmationTokenInvalid, is_token, load_token
+from libs.lazy_schema import LazySchema
+from libs.log import get_logger
 from libs.strings import getText
 from models.confirmation import ConfirmationModel
 from models.user import UserModel
+from pages import confirmation_page
 
-from schemas.confirmation import ConfirmationSchema
-
-confirmation_schema = ConfirmationSchema()
+confirmation_schema = LazySchema("schemas.confirmation:ConfirmationSchema")
+logger = get_logger(__name__)
 
 
 class Confirmation(Resource):
     @classmethod
+    @primary_read()     # it writes, and the confirmation may be too new for the replica
     def get(cls, confirmation_id: str):
         """Return confirmation HTML page."""
+        if is_token(confirmation_id):
+            return cls.confirm_token(confirmation_id)
+
         confirmation = ConfirmationModel.find_by_id(confirmation_id)
         if not confirmation:
             return {"message": getText("confirmation_not_found")}, 404
@@ -29,13 +35,34 @@ class Confirmation(Resource):
             return {"message": getText("confirmation_already_confirmed")}, 400
 
         confirmation.confirmed = True
+        confirmation.user.confirmed = True  # the user's own flag too, committed with the confirmation
         confirmation.save_to_db()
 
-        headers = {"Content-Type": "text/html"}
-        return make_response(render_template("confirmation_page.html", email=confirmation.user.email), 200, headers)
+        return cls.confirmed_page(confirmation.user.email)
         # todo info in we intent to load a page from another location
         # return redirect("http://localhost:300", code=302)
 
+    @classmethod
+    def confirm_token(cls, token: str):
+        # the signature check is pure CPU, the only query is the UPDATE (and a lookup when it changed nothing)
+        try:
+            user_id, email = load_token(token)
+        except ConfirmationTokenExpired:
+            return {"message": getText("confirmation_link_expired")}, 400
+        except ConfirmationTokenInvalid:
+            return {"message": getText("confirmation_not_found")}, 404
+
+        if not UserModel.mark_confirmed(user_id):
+            if not UserModel.find_by_id(user_id):
+                return {"message": getText("confirmation_not_found")}, 404
+            return {"message": getText("confirmation_already_confirmed")}, 400
+
+        return cls.confirmed_page(email)
+
+    @staticmethod
+    def confirmed_page(email: str):
+        return confirmation_page.response(email)   # rendered at startup, see pages.py
+
 
 class ConfirmationByUser(Resource):
     @classmethod
@@ -56,26 +83,30 @@ class ConfirmationByUser(Resource):
     @classmethod
     def post(cls, user_id: int):
         """Resend confirmation email"""
-        user = UserModel.find_by_id(user_id)
+        user = UserModel.find_by_id_with_confirmation(user_id)
         if not user:
             return {"message": getText("user_not_found")}, 404
 
         try:
+            if current_app.config["CONFIRMATION_MODE"] == "token":
+                if user.is_confirmed:
+                    return {"message": getText("confirmation_already_confirmed")}, 400
+                user.send_confirmation_email()  # a fresh token, earlier ones stay valid until they expire
+                return {"message": getText("confirmation_resend_successful")}, 201
+
             confirmation = user.most_recent_confirmation
             if confirmation:
                 if confirmation.confirmed:
                     return {"message": getText("confirmation_already_confirmed")}, 400
-                confirmation.force_to_expire()
+                confirmation.force_to_expire()  # committed together with the new confirmation below
 
             new_confirmation = ConfirmationModel(user_id)
             # lazy=dynamic comes in handy here, as we are saving after user has been created before
             new_confirmation.save_to_db()
-            user.send_confirmation_email()
+            user.send_confirmation_email()  # only queues the email
             return {"message": getText("confirmation_resend_successful")}, 201
-        except MailGunException as err:
-            return {"message": str(err)}, 500
         except:
-            traceback.print_exc()
+            logger.exception("failed to resend confirmation", extra={"fields": {"user_id": user_id}})
             return {"message": getText("confirmation_resend_fail")}, 500
 
 
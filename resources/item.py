@@ -2,21 +2,56 @@ from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 
+from caches import item_cache
+from db import primary_read
+from libs.conditional import dump_validators, is_not_modified, make_etag, not_modified, validator_headers
+from libs.lazy_schema import LazySchema
+from libs.log import get_logger
+from libs.pagination import (
+    PaginationError,
+    STREAM_CHUNK_SIZE,
+    decode_cursor,
+    encode_cursor,
+    next_cursor,
+    parse_limit,
+    parse_page_args,
+    stream_json,
+    wants_stream,
+)
+from libs.sparse_fields import FieldsError, columns_for, project, project_all, requested_fields
 from libs.strings import getText
 from models.item import ItemModel
-from schemas.item import ItemSchema
+from models.store import StoreModel
 
-item_schema = ItemSchema()
-item_list_schema = ItemSchema(many=True)
+item_schema = LazySchema("schemas.item:ItemSchema")
+item_list_schema = LazySchema("schemas.item:ItemSchema", many=True)
+logger = get_logger(__name__)
 
 
 class Item(Resource):
     @classmethod
     def get(cls, name: str):
+        try:
+            fields = requested_fields(ItemModel.ROW_COLUMNS)
+        except FieldsError as err:
+            return {"message": str(err)}, 400
+
+        item_json = item_cache.get_or_load(name, lambda: cls._load(name))  # the whole dump, fields= or not
+        if not item_json:
+            return {"message": getText("item_not_found")}, 404
+
+        etag, last_modified = dump_validators(item_json)
+        if fields:
+            etag = make_etag(etag, *sorted(fields))  # a different representation, a different ETag
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified)
+        return project(item_json, fields), 200, validator_headers(etag, last_modified)
+
+    @classmethod
+    @primary_read()     # right after a write, the replica may still have the old row, and it would stay cached
+    def _load(cls, name: str):
         item = ItemModel.find_by_name(name)
-        if item:
-            return item_schema.dump(item)   # dump:::object to dict
-        return {"message": getText("item_not_found")}, 404
+        return item_schema.dump(item) if item else None   # dump:::object to dict
 
     # This ensures that a new item can be created wen u just logged in- fresh_toke_required
     # NOTE the parameter fresh, not refresh
@@ -24,16 +59,19 @@ class Item(Resource):
     @jwt_required(fresh=True)
     def post(self, name: str):  # /item/chair
         if ItemModel.find_by_name(name):
-            return {"message": getText("item_name_exists").format(name)}, 400
+            return {"message": getText("item_name_exists", name)}, 400
 
         item_json = request.get_json()  # other info, price, store_id
         item_json["name"] = name
 
         item = item_schema.load(item_json)  # errors are caught in app.py as general validation err handler
+        if StoreModel.find_missing_ids([item.store_id]):
+            return {"message": getText("item_store_not_found", item.store_id)}, 400
 
         try:
             item.save_to_db()
         except:
+            logger.exception("failed to insert item", extra={"fields": {"name": name}})
             return {"message": getText("item_error_inserting")}, 500  # Internal Server Error
 
         return item_schema.dump(item), 201
@@ -56,6 +94,8 @@ class Item(Resource):
         if item is None:
             item_json["name"] = name
             item = item_schema.load(item_json)  # errors are caught in app.py as general validation err handler
+            if StoreModel.find_missing_ids([item.store_id]):
+                return {"message": getText("item_store_not_found", item.store_id)}, 400
 
         else:
             item.price = item_json["price"]
@@ -68,4 +108,104 @@ class Item(Resource):
 class ItemList(Resource):
     @classmethod
     def get(cls):
-        return {"items": item_list_schema.dump(ItemModel.find_all())}, 200
+        """
+        Returns a page of items, ?limit=&after= for keyset pagination or ?stream=1 for the whole table,
+        ?fields=name,price for just those columns.
+        """
+        try:
+            fields = requested_fields(ItemModel.ROW_COLUMNS)
+        except FieldsError as err:
+            return {"message": str(err)}, 400
+
+        if wants_stream():
+            columns = columns_for(fields, ItemModel.ROW_COLUMNS)
+            return stream_json("items", ItemModel.iter_rows(STREAM_CHUNK_SIZE, columns))
+
+        try:
+            limit, after = parse_page_args()
+        except PaginationError as err:
+            return {"message": str(err)}, 400
+
+        # a cheap aggregate over the page tells whether the client's copy is still good before we build the body
+        etag = make_etag("items", limit, after, *ItemModel.page_version(limit, after), *sorted(fields or ()))
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        # plain column rows, no ORM objects nor schema dump, the id is read for the cursor even when not asked for
+        items = ItemModel.find_page_rows(limit, after, columns_for(fields, ItemModel.ROW_COLUMNS, required=("id",)))
+        cursor = next_cursor(items, limit)
+        return {"items": project_all(items, fields), "next": cursor}, 200, validator_headers(etag)
+
+    @classmethod
+    @jwt_required(fresh=True)
+    def post(cls):
+        """Creates many items at once, expects {"items": [{"name": ..., "price": ..., "store_id": ...}, ...]}."""
+        items_json = (request.get_json() or {}).get("items")
+        if not isinstance(items_json, list) or not items_json:
+            return {"message": getText("item_batch_invalid")}, 400
+
+        items = item_list_schema.load(items_json)  # errors are caught in app.py as general validation err handler
+
+        names = [item.name for item in items]
+        if len(set(names)) != len(names):
+            return {"message": getText("item_batch_duplicate_names")}, 400
+        existing = ItemModel.find_existing_names(names)  # one query for the whole batch
+        if existing:
+            return {"message": getText("item_names_exist", ", ".join(existing))}, 400
+        missing = StoreModel.find_missing_ids(item.store_id for item in items)
+        if missing:
+            return {"message": getText("item_store_not_found", ", ".join(map(str, missing)))}, 400
+
+        try:
+            items_json = ItemModel.bulk_create(items, dump=item_list_schema.dump)
+        except:
+            logger.exception("failed to insert items", extra={"fields": {"count": len(items)}})
+            return {"message": getText("item_error_inserting")}, 500
+
+        return {"items": items_json}, 201
+
+
+class ItemSearch(Resource):
+    @classmethod
+    def get(cls):
+        """
+        /items/search?name=<prefix>&q=<words>&store_id=<id>&min_price=<n>&max_price=<n>&sort=[-]id|name|price
+        &limit=<n>&after=<next of the previous page>, every parameter is optional.
+        """
+        try:
+            limit = parse_limit()
+            filters = cls._filters()
+            fields = requested_fields(ItemModel.ROW_COLUMNS)
+        except ValueError as err:  # PaginationError and FieldsError included
+            return {"message": str(err)}, 400
+
+        # one index driven query, see ItemModel.search_query
+        items = ItemModel.search_rows(limit, columns=columns_for(fields, ItemModel.ROW_COLUMNS), **filters)
+        key = ItemModel.search_key(filters["sort"])
+        cursor = encode_cursor([items[-1][column] for column in key]) if len(items) == limit else None
+        return {"items": project_all(items, fields), "next": cursor}, 200
+
+    @classmethod
+    def _filters(cls) -> dict:
+        sort = request.args.get("sort", "id")
+        if sort.lstrip("-") not in ItemModel.SEARCH_SORTS:
+            raise ValueError(getText("search_invalid_sort", ", ".join(ItemModel.SEARCH_SORTS)))
+        return {
+            "name_prefix": request.args.get("name") or None,
+            "text": request.args.get("q") or None,
+            "store_id": cls._number("store_id", int),
+            "min_price": cls._number("min_price", float),
+            "max_price": cls._number("max_price", float),
+            "sort": sort,
+            "after": decode_cursor(request.args.get("after"), len(ItemModel.search_key(sort))),
+        }
+
+    @staticmethod
+    def _number(name: str, cast):
+        value = request.args.get(name)
+        if value is None or value == "":
+            return None
+        try:
+            return cast(value)
+        except ValueError:
+            raise ValueError(getText("search_invalid_number", name))
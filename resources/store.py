@@ -1,30 +1,66 @@
 from flask_restful import Resource
 
+from caches import store_cache
+from db import primary_read
+from libs.conditional import dump_validators, is_not_modified, make_etag, not_modified, validator_headers
+from libs.lazy_schema import LazySchema
+from libs.log import get_logger
+from libs.pagination import PaginationError, STREAM_CHUNK_SIZE, next_cursor, parse_page_args, stream_json, wants_stream
+from libs.sparse_fields import (
+    FieldsError,
+    columns_for,
+    project,
+    project_all,
+    requested_fields,
+    sparse_schema,
+    split_fields,
+)
 from libs.strings import getText
+from models.item import ItemModel
 from models.store import StoreModel
-from schemas.store import StoreSchema
 
-store_schema = StoreSchema()
-store_list_schema = StoreSchema(many=True)
+STORE_SCHEMA = "schemas.store:StoreSchema"
+STORE_FIELDS = (*StoreModel.ROW_COLUMNS, "items", *(f"items.{column}" for column in ItemModel.ROW_COLUMNS))
+
+store_schema = LazySchema(STORE_SCHEMA)
+logger = get_logger(__name__)
 
 
 class Store(Resource):
     @classmethod
     def get(cls, name: str):
+        try:
+            fields = requested_fields(STORE_FIELDS)
+        except FieldsError as err:
+            return {"message": str(err)}, 400
+
+        store_json = store_cache.get_or_load(name, lambda: cls._load(name))  # the whole dump, fields= or not
+        if not store_json:
+            return {"message": getText("store_not_found")}, 404
+
+        etag, last_modified = dump_validators(store_json)  # updated_at also moves when one of its items changes
+        if fields:
+            etag = make_etag(etag, *sorted(fields))
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified)
+        return project(store_json, fields), 200, validator_headers(etag, last_modified)
+
+    @classmethod
+    @primary_read()     # right after a write, the replica may still have the old row, and it would stay cached
+    def _load(cls, name: str):
         store = StoreModel.find_by_name(name)
-        if store:
-            return store_schema.dump(store), 200
-        return {"message": getText("store_not_found")}, 404
+        return store_schema.dump(store) if store else None
 
     @classmethod
     def post(cls, name: str):
         if StoreModel.find_by_name(name):
-            return {"message": getText("store_name_exists").format(name)}, 400
+            return {"message": getText("store_name_exists", name)}, 400
 
         store = StoreModel(name=name)
         try:
             store.save_to_db()
         except:
+            logger.exception("failed to insert store", extra={"fields": {"name": name}})
             return {"message": getText("store_error_inserting")}, 500
 
         return store_schema.dump(store), 201
@@ -41,4 +77,34 @@ class Store(Resource):
 class StoreList(Resource):
     @classmethod
     def get(cls):
-        return {"stores": store_list_schema.dump(StoreModel.find_all())}
+        """
+        Returns a page of stores, ?limit=&after= for keyset pagination or ?stream=1 for the whole table,
+        ?fields=name,items.name for just those fields (without any items field, the items aren't read at all).
+        """
+        try:
+            fields = requested_fields(STORE_FIELDS)
+        except FieldsError as err:
+            return {"message": str(err)}, 400
+
+        top, nested = split_fields(fields)
+        with_items = fields is None or "items" in top
+        columns = columns_for(top - {"items"} if fields else None, StoreModel.ROW_COLUMNS, required=("id",))
+        item_columns = columns_for(nested.get("items"), ItemModel.ROW_COLUMNS)
+
+        if wants_stream():
+            stores = StoreModel.iter_all_with_items(STREAM_CHUNK_SIZE, columns, item_columns, with_items)
+            return stream_json("stores", stores, sparse_schema(STORE_SCHEMA, fields).dump)
+
+        try:
+            limit, after = parse_page_args()
+        except PaginationError as err:
+            return {"message": str(err)}, 400
+
+        etag = make_etag("stores", limit, after, *StoreModel.page_version(limit, after), *sorted(fields or ()))
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        # 2 queries whatever the page size (1 without items), no ORM objects
+        stores = StoreModel.find_page_rows(limit, after, columns, item_columns, with_items)
+        cursor = next_cursor(stores, limit)
+        return {"stores": project_all(stores, fields), "next": cursor}, 200, validator_headers(etag)
@@ -1,22 +1,29 @@
-import hmac
-import traceback
-
-from flask import request
+from flask import current_app, request
 from flask_restful import Resource
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt
 
-from libs.mail_gun import MailGunException
+from libs.lazy_schema import LazySchema
+from libs.log import get_logger
+from libs.passwords import PasswordHasherBusy, hasher
+from libs.sparse_fields import FieldsError, requested_fields, sparse_schema
+from libs.user_import import import_users
 from libs.strings import getText
 from models.confirmation import ConfirmationModel
-from schemas.user import UserSchema
 from models.user import UserModel
 from blacklist import BLACKLIST
+from rate_limits import LOGIN_LIMITS, REGISTER_LIMITS, limiter
+
+USER_SCHEMA = "schemas.user:UserSchema"
+USER_FIELDS = ("id", "username", "email", "confirmed", "confirmation")   # what UserSchema dumps
 
-user_schema = UserSchema()
+user_schema = LazySchema(USER_SCHEMA)
+USER_IMPORT_MAX_ROWS = 10000  # per request, `flask import-users` has no limit
+logger = get_logger(__name__)
 
 
 class UserRegister(Resource):
     @classmethod
+    @limiter.limit(*REGISTER_LIMITS)     # checked before the body is even validated
     def post(cls):
         user = user_schema.load(request.get_json())     # errors are caught in app.py as general validation err handler
 
@@ -26,23 +33,41 @@ class UserRegister(Resource):
         if UserModel.find_by_email(user.email):
             return {"message": getText("user_email_exists")}, 400
 
+        try:
+            user.set_password(user.password)
+        except PasswordHasherBusy as err:
+            return {"message": str(err)}, 503
+
         try:
 
             user.save_to_db()
-            confirmation = ConfirmationModel(user.id)
-            confirmation.save_to_db()   # lazy=dynamic handy saving child(confirmation) after user was created before
-            user.send_confirmation_email()
+            if current_app.config["CONFIRMATION_MODE"] == "database":   # token mode needs no row, see libs.confirmation_token
+                confirmation = ConfirmationModel(user.id)
+                confirmation.save_to_db()   # lazy=dynamic handy saving child(confirmation) after user was created before
+            user.send_confirmation_email()  # only queues the email, no round trip to Mailgun here
             return {"message": getText("user_registered")}, 201
 
-        except MailGunException as err:
-            user.delete_from_db() # rollback
-            return {"message": str(err)}, 500
         except:  # failed to save user to db
-            traceback.print_exc()
+            logger.exception("failed to register user", extra={"fields": {"username": user.username}})
             user.delete_from_db()
             return {"message": getText("user_error_creating")}, 500
 
 
+class UserImport(Resource):
+    @classmethod
+    @jwt_required(fresh=True)
+    def post(cls):
+        """Registers many users at once, expects {"users": [{"username": ..., "password": ..., "email": ...}, ...]}."""
+        users_json = (request.get_json() or {}).get("users")
+        if not isinstance(users_json, list) or not users_json:
+            return {"message": getText("user_import_invalid")}, 400
+        if len(users_json) > USER_IMPORT_MAX_ROWS:
+            return {"message": getText("user_import_too_many", USER_IMPORT_MAX_ROWS)}, 400
+
+        report = import_users(users_json)
+        return report.to_dict(), 201 if report.created else 400
+
+
 class User(Resource):
     """
     This resource can be useful when testing our Flask app. We may not want to expose it to public users, but for the
@@ -51,10 +76,18 @@ class User(Resource):
 
     @classmethod
     def get(cls, user_id: int):
-        user = UserModel.find_by_id(user_id)
+        try:
+            fields = requested_fields(USER_FIELDS)
+        except FieldsError as err:
+            return {"message": str(err)}, 400
+
+        if fields is None or not fields.isdisjoint(("confirmation", "confirmed")):  # is_confirmed may need the row
+            user = UserModel.find_by_id_with_confirmation(user_id)
+        else:
+            user = UserModel.find_by_id(user_id, columns=fields)    # just the columns asked for
         if not user:
             return {"message": getText("user_not_found")}, 404
-        return user_schema.dump(user), 200    # the dump converts directly into dictionary
+        return sparse_schema(USER_SCHEMA, fields).dump(user), 200    # the dump converts directly into dictionary
 
     @classmethod
     def delete(cls, user_id: int):
@@ -67,6 +100,7 @@ class User(Resource):
 
 class UserLogin(Resource):
     @classmethod
+    @limiter.limit(*LOGIN_LIMITS)
     def post(cls):
 
         user_json = request.get_json()
@@ -74,29 +108,36 @@ class UserLogin(Resource):
         # email will be ignored, by using partial
         user_data = user_schema.load(user_json, partial=("email",))
 
-        user = UserModel.find_by_username(user_data.username)
+        user = UserModel.find_by_username_with_confirmation(user_data.username)  # one query, memoizes the confirmation
 
         # this is what the `authenticate()` function did in security.py
-        if user and hmac.compare_digest(user.password, user_data.password):
+        try:
+            if user is not None:
+                authenticated = user.check_password(user_data.password)     # hashing runs in a pool
+            else:
+                authenticated = hasher.verify_unknown(user_data.password)   # same cost, no username enumeration
+        except PasswordHasherBusy as err:
+            return {"message": str(err)}, 503
+
+        if authenticated:
             # identity= is what the identity() function did in security.py—now stored in the JWT
-            confirmation = user.most_recent_confirmation
-            if confirmation and confirmation.confirmed:
+            if user.is_confirmed:
                 access_token = create_access_token(identity=user.id, fresh=True)
                 refresh_token = create_refresh_token(user.id)
                 return {"access_token": access_token, "refresh_token": refresh_token}, 200
-            return {"message": getText("user_not_confirmed").format(user.username)}, 400
+            return {"message": getText("user_not_confirmed", user.username)}, 400
 
         return {"message": getText("user_invalid_credentials")}, 401
 
 
 class UserLogout(Resource):
     @classmethod
-    @jwt_required
+    @jwt_required()
     def post(cls):
         jti = get_jwt()["jti"]  # jti is "JWT ID", a unique identifier for a JWT.
         sub = get_jwt()["sub"]
-        BLACKLIST.add(jti)
-        return {"message": getText("user_logged_out").format(sub)}, 200
+        BLACKLIST.add(jti, get_jwt()["exp"])  # exp tells the store when it can forget the token
+        return {"message": getText("user_logged_out", sub)}, 200
 
 
 class TokenRefresh(Resource):
@@ -7,7 +7,7 @@ class ItemSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = ItemModel
         load_only = ("store",)
-        dump_only = ("id",)
+        dump_only = ("id", "updated_at")
         include_fk = True
         load_instance = True
 
@@ -5,11 +5,11 @@ from schemas.item import ItemSchema
 
 
 class StoreSchema(ma.SQLAlchemyAutoSchema):
-    items = ma.Nested(ItemSchema, many=True)
+    items = ma.Nested(ItemSchema, many=True, attribute="loaded_items", dump_only=True)  # see StoreModel.prefetch_items
 
     class Meta:
         model = StoreModel
-        dump_only = ("id",)
+        dump_only = ("id", "updated_at")
         include_fk = True
         load_instance = True
 
@@ -1,21 +1,24 @@
 from ma import ma
-from marshmallow import pre_dump
+from marshmallow import fields
 from models.user import UserModel
 
 
 # todo: info passing in the UserModel here, checks the fields and ensures user object is passed back instead of dict
 class UserSchema(ma.SQLAlchemyAutoSchema):
+    # ensuring to send back only the most_recent_confirmation
+    # (read from the memoized property, assigning to the dynamic `confirmation` relationship would load all of them)
+    confirmation = fields.Method("_dump_confirmation", dump_only=True)
+    # users confirmed through a confirmation row before the column was set in that mode too only have the row
+    confirmed = fields.Boolean(attribute="is_confirmed", dump_only=True)
+
     class Meta:
         model = UserModel
         load_only = ("password",)   # don't include when returning to user
-        dump_only = ("id", "confirmation")  # not needed when passing data for creation
+        dump_only = ("id", "confirmation", "confirmed")  # not needed when passing data for creation
         include_relationships = True
         load_instance = True
 
-    # called before dumping
-    # ensuring to send back only the most_recent_confirmation
-    @pre_dump   # not we have post_dump, pre_load, post_load
-    def _pre_dump(self, user: UserModel, **kwargs):
-        user.confirmation = [user.most_recent_confirmation]
-        return user
-
+    @staticmethod
+    def _dump_confirmation(user: UserModel):
+        confirmation = user.most_recent_confirmation
+        return [confirmation.id] if confirmation else []
@@ -0,0 +1,51 @@
+"""
+serve_async.py
+
+Asynchronous serving mode: every request runs in a gevent greenlet instead of an OS thread, so a request waiting on
+the database, Mailgun or Redis parks a greenlet (a few KB) rather than a worker thread, and one process can hold
+thousands of in-flight requests. The resources stay as they are, monkey patching makes the sockets under psycopg2
+(with psycogreen), requests and redis cooperative.
+
+    python serve_async.py                       # or: gunicorn -k gevent --worker-connections 2000 "app:create_app()"
+
+ASYNC_HOST / ASYNC_PORT pick the address, ASYNC_MAX_CONNECTIONS (default 2000) caps the requests in flight. Past the
+database pool (DB_POOL_SIZE + DB_MAX_OVERFLOW) requests queue for a connection for up to DB_POOL_TIMEOUT. Password
+hashing still runs in libs.passwords' process pool, waiting for it only parks the greenlet.
+
+Needs the optional `gevent` package, plus `psycogreen` when DATABASE_URI is Postgres.
+"""
+from gevent import monkey
+
+monkey.patch_all()  # before anything else imports socket, ssl or threading
+
+import os  # noqa: E402
+
+from gevent.pool import Pool  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+try:
+    from psycogreen.gevent import patch_psycopg
+except ImportError:  # optional, only needed with psycopg2
+    patch_psycopg = None
+
+from app import create_app  # noqa: E402
+from libs.log import get_logger  # noqa: E402
+
+ASYNC_HOST = os.environ.get("ASYNC_HOST", "127.0.0.1")
+ASYNC_PORT = int(os.environ.get("ASYNC_PORT", 5000))
+ASYNC_MAX_CONNECTIONS = int(os.environ.get("ASYNC_MAX_CONNECTIONS", 2000))
+
+logger = get_logger(__name__)
+
+
+def serve(app=None, host: str = ASYNC_HOST, port: int = ASYNC_PORT, max_connections: int = ASYNC_MAX_CONNECTIONS):
+    if patch_psycopg is not None:
+        patch_psycopg()     # psycopg2 is a C extension, it waits on the socket cooperatively only when told to
+    app = app or create_app({"OUTBOX_WORKER": True})
+    server = WSGIServer((host, port), app, spawn=Pool(max_connections), log=None)
+    logger.info("serving", extra={"fields": {"host": host, "port": port, "max_connections": max_connections}})
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,32 @@
+import os
+
+# read at import time by the modules below, so set before any of them is imported
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")     # hash inline, no process pool to start and stop
+os.environ.setdefault("PASSWORD_SCRYPT_N", "1024")
+
+import pytest
+
+from app import create_app
+from db import db
+
+
+@pytest.fixture
+def app():
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite://",     # in memory, a fresh database per test
+        "TESTING": True,
+        "METRICS_ENABLED": False,
+        "RATE_LIMIT_ENABLED": False,
+        "OUTBOX_WORKER": False,     # the emails stay queued, no delivery thread to stop
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,69 @@
+from flask_jwt_extended import create_access_token
+
+from db import db
+from libs.query_counter import count_queries
+from models.item import ItemModel
+from models.store import StoreModel
+
+
+def fresh_token_header() -> dict:
+    return {"Authorization": f"Bearer {create_access_token(identity=1, fresh=True)}"}
+
+
+def test_put_item_with_an_unknown_store_is_a_bad_request(client):
+    response = client.put("/item/ghost", json={"price": 1.5, "store_id": 999})
+
+    assert response.status_code == 400
+    assert "999" in response.json["message"]
+
+
+def test_put_item_creates_it_in_an_existing_store(client):
+    db.session.add(StoreModel(name="shop"))
+    db.session.commit()
+
+    response = client.put("/item/chair", json={"price": 1.5, "store_id": 1})
+
+    assert response.status_code == 200
+    assert client.get("/store/shop").json["items"][0]["name"] == "chair"
+
+
+def test_item_batch_with_an_unknown_store_is_a_bad_request(client):
+    db.session.add(StoreModel(name="shop"))
+    db.session.commit()
+    items = [{"name": "a", "price": 1, "store_id": 1}, {"name": "b", "price": 2, "store_id": 7}]
+
+    response = client.post("/items", json={"items": items}, headers=fresh_token_header())
+
+    assert response.status_code == 400
+    assert "7" in response.json["message"]
+
+
+def selects_to_create(count: int, prefix: str) -> int:
+    items = [ItemModel(name=f"{prefix}{n}", price=n, store_id=1) for n in range(count)]
+    with count_queries() as counter:
+        ItemModel.bulk_create(items)
+    return sum(statement.lstrip().upper().startswith("SELECT") for statement in counter.statements)
+
+
+def test_bulk_create_does_not_reload_each_item_to_invalidate_the_caches(client):
+    db.session.add(StoreModel(name="shop"))
+    db.session.commit()
+
+    assert selects_to_create(1, "one") == selects_to_create(30, "many")
+
+
+def queries_to_post(client, count: int, prefix: str) -> int:
+    items = [{"name": f"{prefix}{n}", "price": n, "store_id": 1} for n in range(count)]
+    with count_queries() as counter:
+        response = client.post("/items", json={"items": items}, headers=fresh_token_header())
+    assert response.status_code == 201
+    assert [item["name"] for item in response.json["items"]] == [item["name"] for item in items]
+    assert all(item["id"] and item["request_id"] for item in response.json["items"])
+    return sum(not statement.lstrip().upper().startswith("INSERT") for statement in counter.statements)
+
+
+def test_item_batch_queries_besides_the_inserts_do_not_grow_with_the_batch(client):
+    db.session.add(StoreModel(name="shop"))
+    db.session.commit()
+
+    assert queries_to_post(client, 1, "one") == queries_to_post(client, 50, "many")
@@ -0,0 +1,66 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from libs import mail_gun
+from libs.mail_gun import Mailgun, MailGunException
+
+
+class FakeMailgun(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the real API does
+    connections = []    # (client port, path) of every request, a new port means a new connection
+    status = 200
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.connections.append((self.client_address[1], self.path))
+        body = b'{"id": "<test>", "message": "Queued. Thank you."}'
+        self.send_response(self.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_mailgun(monkeypatch):
+    FakeMailgun.connections, FakeMailgun.status = [], 200
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMailgun)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(mail_gun, "MAILGUN_API_BASE", f"http://127.0.0.1:{server.server_port}/v3")
+    monkeypatch.setattr(Mailgun, "MAILGUN_DOMAIN", "mg.test")
+    monkeypatch.setattr(Mailgun, "MAILGUN_API_KEY", "key")
+    monkeypatch.setattr(Mailgun, "session", mail_gun._build_session())    # no connection left from another test
+    yield FakeMailgun
+    Mailgun.session.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_emails_reuse_one_connection(fake_mailgun):
+    for n in range(20):
+        Mailgun.send_confirmation_email([f"user{n}@test.com"], "subject", "text", "<p>html</p>")
+
+    assert len(fake_mailgun.connections) == 20
+    assert {path for _, path in fake_mailgun.connections} == {"/v3/mg.test/messages"}
+    assert len({port for port, _ in fake_mailgun.connections}) == 1
+
+
+def test_batch_email_is_one_request_per_thousand_recipients(fake_mailgun):
+    recipients = {f"user{n}@test.com": {"link": f"http://test/{n}"} for n in range(2500)}
+
+    Mailgun.send_batch_email(recipients, "subject", "%recipient.link%", "<p>%recipient.link%</p>")
+
+    assert len(fake_mailgun.connections) == 3
+    assert len({port for port, _ in fake_mailgun.connections}) == 1
+
+
+def test_error_status_raises(fake_mailgun):
+    fake_mailgun.status = 500
+
+    with pytest.raises(MailGunException):
+        Mailgun.send_confirmation_email(["user@test.com"], "subject", "text", "<p>html</p>")
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from app import create_app
+from libs.mail_gun import Mailgun
+
+DISABLED = """
+import os
+os.environ.update(SECRET_KEY="test", JWT_SECRET_KEY="test", PASSWORD_HASH_WORKERS="0")
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import create_app
+from libs.mail_gun import Mailgun
+import metrics
+create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "METRICS_ENABLED": False})
+print(any(event.contains(Engine, name, listener) for name, listener in metrics.SQL_LISTENERS), Mailgun.latency_observer)
+"""
+
+
+def test_disabled_metrics_install_no_hooks():
+    # in a process of its own, the hooks are process wide and another test may have installed them
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", DISABLED], capture_output=True, text=True, check=True, cwd=root)
+
+    assert result.stdout.split() == ["False", "None"]
+
+
+def test_enabled_metrics_count_sql_and_observe_mailgun(monkeypatch):
+    monkeypatch.setattr(Mailgun, "latency_observer", None)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "METRICS_ENABLED": True, "OUTBOX_WORKER": False})
+    client = app.test_client()
+
+    client.get("/stores")
+    body = client.get("/metrics").get_data(as_text=True)
+
+    assert 'sql_queries_per_request_count{route="/stores"} 1' in body
+    assert Mailgun.latency_observer is not None
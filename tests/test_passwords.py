@@ -0,0 +1,39 @@
+import threading
+import time
+
+import pytest
+
+from libs.passwords import PasswordHasher
+
+
+@pytest.fixture
+def pooled_hasher():
+    hasher = PasswordHasher(n=2 ** 14, workers=2, max_pending=8, timeout=30)
+    hasher.hash_many(["warm up"] * 4)  # starts both workers, spawning them takes a while
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_many_returns_a_hash_per_password(pooled_hasher):
+    passwords = [f"password{i}" for i in range(10)]
+
+    hashes = pooled_hasher.hash_many(passwords)
+
+    assert all(pooled_hasher.verify(password, encoded) for password, encoded in zip(passwords, hashes))
+
+
+def test_single_hash_does_not_wait_behind_a_bulk_import(pooled_hasher):
+    started = time.perf_counter()
+    pooled_hasher.hash("one")
+    one_hash = time.perf_counter() - started
+
+    bulk = threading.Thread(target=pooled_hasher.hash_many, args=([f"password{i}" for i in range(40)],))
+    bulk.start()
+    time.sleep(0.1)
+    started = time.perf_counter()
+    pooled_hasher.hash("login")
+    waited = time.perf_counter() - started
+    bulk.join()
+
+    # behind at most one queued bulk hash per worker, not behind the 40 of them (about 20 hash times)
+    assert waited < 6 * one_hash
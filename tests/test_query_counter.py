@@ -0,0 +1,39 @@
+from db import db
+from libs.query_counter import count_queries
+from models.item import ItemModel
+from models.store import StoreModel
+
+ITEMS_PER_STORE = 3
+
+
+def add_stores(first: int, last: int) -> None:
+    db.session.execute(StoreModel.__table__.insert(), [{"id": i, "name": f"store{i}"} for i in range(first, last + 1)])
+    db.session.execute(ItemModel.__table__.insert(), [
+        {"name": f"item{i}-{n}", "price": n, "request_id": f"TEST-{i}-{n}", "store_id": i}
+        for i in range(first, last + 1) for n in range(ITEMS_PER_STORE)
+    ])
+    db.session.commit()
+
+
+def queries_for(client, url: str) -> int:
+    with count_queries() as counter:
+        response = client.get(url)
+        assert response.status_code == 200
+        response.get_data()     # a streamed body only runs its queries when it is read
+    return counter.count
+
+
+def test_store_list_queries_do_not_grow_with_the_stores(client):
+    add_stores(1, 1)
+    one = queries_for(client, "/stores?limit=50"), queries_for(client, "/stores?stream=1")
+
+    add_stores(2, 40)
+    many = queries_for(client, "/stores?limit=50"), queries_for(client, "/stores?stream=1")
+
+    assert one == many
+
+
+def test_store_list_page_and_items_are_read_in_a_fixed_number_of_queries(client):
+    add_stores(1, 40)
+
+    assert queries_for(client, "/stores?limit=50") == 3    # page version, stores, their items
@@ -0,0 +1,70 @@
+import pytest
+
+from app import create_app
+from db import REPLICA_BIND, db
+from models.confirmation import ConfirmationModel
+from models.store import StoreModel
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    A primary and a replica that never catches up, two SQLite files. No app context is kept pushed: the requests
+    need their own, a session that has written sticks to the primary until its context ends.
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "SQLALCHEMY_BINDS": {REPLICA_BIND: f"sqlite:///{tmp_path / 'replica.db'}"},
+        "TESTING": True,
+        "METRICS_ENABLED": False,
+        "RATE_LIMIT_ENABLED": False,
+        "OUTBOX_WORKER": False,
+    })
+    with app.app_context():
+        db.Model.metadata.create_all(db.get_engine(app, bind=REPLICA_BIND))
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_to_both(app, table, values) -> None:
+    with app.app_context():
+        for bind in (None, REPLICA_BIND):
+            with db.get_engine(app, bind=bind).begin() as connection:
+                connection.execute(table.insert(), values)
+
+
+def test_cache_fill_after_a_write_reads_the_primary(app, client):
+    add_to_both(app, StoreModel.__table__, {"id": 1, "name": "shop"})
+    assert client.put("/item/chair", json={"price": 1.0, "store_id": 1}).status_code == 200
+    assert client.get("/item/chair").json["price"] == 1.0
+
+    assert client.put("/item/chair", json={"price": 2.0}).status_code == 200    # the replica still has no chair
+
+    assert client.get("/item/chair").json["price"] == 2.0
+    assert client.get("/store/shop").json["items"][0]["price"] == 2.0
+
+
+def test_confirmation_link_works_before_the_replica_has_it(app, client):
+    response = client.post("/register", json={"username": "bob", "password": "secret", "email": "bob@test.com"})
+    assert response.status_code == 201
+    with app.app_context():
+        confirmation_id = ConfirmationModel.query.one().id
+
+    response = client.get(f"/confirmation/{confirmation_id}")
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert ConfirmationModel.query.one().confirmed
+
+
+def test_list_reads_still_go_to_the_replica(app, client):
+    add_to_both(app, StoreModel.__table__, {"id": 1, "name": "shop"})
+    assert client.post("/store/mall").status_code == 201    # only on the primary
+
+    names = [store["name"] for store in client.get("/stores").json["stores"]]
+
+    assert names == ["shop"]
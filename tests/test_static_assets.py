@@ -0,0 +1,45 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from libs.static_assets import AssetRegistry
+
+CSS = ".rule { margin: 10px; }\n" * 200
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / "site.css").write_text(CSS)
+    app = Flask(__name__)
+    registry = AssetRegistry(str(tmp_path))
+    registry.init_app(app)
+    with app.test_request_context():
+        url = registry.url("site.css")
+    return app.test_client(), url
+
+
+def test_each_encoding_has_its_own_etag(assets):
+    client, url = assets
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+
+    assert plain.data.decode() == CSS
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gzipped.data).decode() == CSS
+    assert plain.headers["ETag"] != gzipped.headers["ETag"]
+    assert plain.headers["Cache-Control"] == gzipped.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+
+def test_not_modified_only_for_the_etag_of_the_negotiated_encoding(assets):
+    client, url = assets
+    gzip_etag = client.get(url, headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    revalidated = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+    other_encoding = client.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": gzip_etag})
+
+    assert revalidated.status_code == 304
+    assert revalidated.headers["Vary"] == "Accept-Encoding"
+    assert other_encoding.status_code == 200
+    assert other_encoding.data.decode() == CSS
@@ -0,0 +1,28 @@
+import pytest
+
+from libs import strings
+from libs.strings import _formatter
+
+
+@pytest.mark.parametrize("template, args, kwargs", [
+    ("A store with name '{}' already exists.", ("shop",), {}),
+    ("{}", (1.5,), {}),
+    ("x{{y}} {} z}}", (3,), {}),
+    ("{0}", ("a", "unused"), {}),
+    ("{name}!", (), {"name": "n"}),
+    ("{0}-{0}", ("a",), {}),
+    ("{:>5}", ("a",), {}),
+    ("{!r}", ("a",), {}),
+    ("{} and {}", (1, 2), {}),
+    ("no field", (), {}),
+])
+def test_formatter_matches_str_format(template, args, kwargs):
+    assert _formatter(template)(*args, **kwargs) == template.format(*args, **kwargs)
+
+
+def test_every_message_formats_like_str_format():
+    catalogue = strings._catalogue
+    for locale in catalogue.locales:
+        for template, formatter in zip(catalogue.templates[locale], catalogue.formatters[locale]):
+            if template is not None:
+                assert formatter("<arg>") == template.format("<arg>")
@@ -0,0 +1,67 @@
+import pytest
+
+from db import db
+from libs import passwords
+from models.confirmation import ConfirmationModel
+from models.user import UserModel
+
+
+@pytest.fixture
+def verifications(monkeypatch):
+    calls = []
+    verify = passwords._verify
+
+    def counting_verify(password, encoded):
+        calls.append(encoded)
+        return verify(password, encoded)
+
+    monkeypatch.setattr(passwords, "_verify", counting_verify)
+    return calls
+
+
+def register(client, username: str, password: str) -> None:
+    response = client.post("/register", json={"username": username, "password": password, "email": f"{username}@test.com"})
+    assert response.status_code == 201
+
+
+def test_login_with_an_unknown_username_still_verifies_a_hash(client, verifications):
+    response = client.post("/login", json={"username": "nobody", "password": "secret"})
+
+    assert response.status_code == 401
+    assert len(verifications) == 1
+    assert verifications[0].startswith("scrypt$")
+
+
+def test_login_with_a_wrong_password_verifies_once(client, verifications):
+    register(client, "bob", "right-password")
+
+    response = client.post("/login", json={"username": "bob", "password": "wrong-password"})
+
+    assert response.status_code == 401
+    assert len(verifications) == 1
+    assert response.json == client.post("/login", json={"username": "nobody", "password": "x"}).json
+
+
+def test_user_dump_is_confirmed_after_confirming_in_database_mode(app, client):
+    register(client, "carol", "secret")
+    user_id = UserModel.find_by_username("carol").id
+    assert client.get(f"/user/{user_id}").json["confirmed"] is False
+
+    assert client.get(f"/confirmation/{ConfirmationModel.query.one().id}").status_code == 200
+    db.session.remove()     # what follows reads the database, not objects left in the session by the requests
+
+    assert client.post("/login", json={"username": "carol", "password": "secret"}).status_code == 200
+    assert client.get(f"/user/{user_id}").json["confirmed"] is True
+    assert client.get(f"/user/{user_id}?fields=confirmed").json == {"confirmed": True}
+    assert UserModel.find_by_id(user_id).confirmed
+
+
+def test_user_confirmed_only_through_a_confirmation_row_dumps_as_confirmed(client):
+    register(client, "dave", "secret")
+    confirmation = ConfirmationModel.query.one()
+    confirmation.confirmed = True   # as confirmed before the user's own column was set in database mode
+    user_id = confirmation.user_id
+    db.session.commit()
+    db.session.remove()
+
+    assert client.get(f"/user/{user_id}").json["confirmed"] is True